@@ -0,0 +1,249 @@
+# -*- coding: UTF-8 -*-
+
+# Benchmark of testlib2 overhead: the program is replaced by a stand-in solver, so all the time which is not
+# spent by the solver is spent by the driver (settings, saving and deleting of results, logs).
+#
+#   python benchmark.py                   1-D, 2-D and N-D sweeps of 10^2, 10^3 and 10^4 points
+#   python benchmark.py --sizes 100 --field 200x200 --delay 0.01
+#
+# Every result is appended to benchmark.txt in directory for results, so speedups and regressions are visible over
+# time.
+
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+import contextlib
+import subprocess
+
+import testlib2
+
+
+# Name of file with history of benchmarks, it is kept in directory for results (not in the repository)
+history_filename = os.path.join(testlib2.path_to_result_dir, 'benchmark.txt')
+
+history_columns = (
+    'date', 'revision', 'case', 'points', 'workers', 'delay', 'field', 'detector',
+    'elapsed', 'points_per_second', 'overhead', 'latency_p50', 'latency_p95'
+)
+
+# Names of parameters of stand-in solver, one for every dimension of sweep
+bench_parameters = ('BenchP1', 'BenchP2', 'BenchP3', 'BenchP4')
+
+cases = (
+    ('1d', 1),
+    ('2d', 2),
+    ('nd', len(bench_parameters)),
+)
+
+
+def solver():
+    # stand-in for the program: reads settings from cwd, sleeps, writes results of requested size
+    delay = float(os.environ.get('BENCH_DELAY', '0'))
+    rows, cols = [int(s) for s in os.environ.get('BENCH_FIELD', '100x100').split('x')]
+    detector = int(os.environ.get('BENCH_DETECTOR', '1000'))
+
+    with open(testlib2.settings_filename) as settings_file:
+        seed = len(settings_file.read()) % 97
+
+    time.sleep(delay)
+
+    # field is a matrix like Ez.txt, detector is a time series like detector_filtered_field.txt
+    with open('Ez.txt', 'w') as field_file:
+        for i in range(rows):
+            field_file.write(' '.join('{:.6e}'.format((i * cols + j + seed) * 1e-3) for j in range(cols)) + '\n')
+    with open('detector_filtered_field.txt', 'w') as detector_file:
+        for t in range(detector):
+            detector_file.write('{} {:.6e}\n'.format(t, (t + seed) * 1e-3))
+
+    for filename in testlib2.files_for_save + testlib2.files_for_delete:
+        if not os.path.exists(filename):
+            with open(filename, 'w') as small_file:
+                small_file.write('{}\n'.format(seed))
+
+
+def percentile(values, q):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(int(q * len(values)), len(values) - 1)]
+
+
+def revision():
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=os.path.dirname(os.path.abspath(__file__)),
+            stderr=subprocess.DEVNULL
+        ).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ''
+
+
+def prepare(work_dir, args):
+    # solution directory with settings file and stand-in solver, all the paths of testlib2 point into it
+    solution_dir = os.path.join(work_dir, 'solution')
+    os.makedirs(solution_dir)
+    with open(os.path.join(solution_dir, testlib2.settings_filename), 'w') as settings_file:
+        settings_file.write('[Benchmark]\n')
+        for name in bench_parameters:
+            settings_file.write('{} = 0 ; parameter of benchmark\n'.format(name))
+        # the rest of file is similar to real settings
+        for k in range(200):
+            settings_file.write('Setting{} = {}\n'.format(k, k * 0.5))
+
+    testlib2.path_to_solution = solution_dir + os.sep
+    testlib2.path_to_settings = os.path.join(solution_dir, testlib2.settings_filename)
+    testlib2.path_to_program = [sys.executable, os.path.abspath(__file__), '--solver']
+    testlib2.path_to_result_dir = os.path.join(work_dir, 'results') + os.sep
+    testlib2.path_to_scratch_dir = os.path.join(work_dir, 'scratch') + os.sep
+
+    os.environ['BENCH_DELAY'] = str(args.delay)
+    os.environ['BENCH_FIELD'] = args.field
+    os.environ['BENCH_DETECTOR'] = str(args.detector)
+    return solution_dir
+
+
+def run_case(name, dimensions, size, args, work_dir):
+    # size points are split evenly between dimensions of sweep
+    n = max(int(round(size ** (1.0 / dimensions))), 1)
+    parameters = [testlib2.Parameter(p, 0, n - 1, step=1) for p in bench_parameters[:dimensions]]
+    res_dir = os.path.join(work_dir, 'results', '{}_{}'.format(name, size))
+
+    log = testlib2.Log(os.path.join(work_dir, 'benchmark_log.txt'))
+    metrics = testlib2.Metrics()
+    start_time = time.time()
+    # messages of log are still formatted and written into file, but not into console
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        if args.workers > 0:
+            errors = testlib2.parallel_parameters_test(
+                *parameters, res_dir=res_dir, log=log.q, workers=args.workers, metrics=metrics
+            )
+        else:
+            errors = testlib2.n_parameters_test(*parameters, res_dir=res_dir, log=log.q, metrics=metrics)
+    elapsed = time.time() - start_time
+    log.close()
+
+    rows = metrics.rows
+    latencies = [row.get('settings', 0) + row.get('harvest', 0) for row in rows]
+    solver_time = sum(row.get('wall', 0) for row in rows)
+    points = n ** dimensions
+    if not args.keep:
+        shutil.rmtree(res_dir, ignore_errors=True)
+
+    return {
+        'case': name,
+        'points': points,
+        'workers': args.workers,
+        'delay': args.delay,
+        'field': args.field,
+        'detector': args.detector,
+        'elapsed': elapsed,
+        'points_per_second': points / elapsed if elapsed > 0 else 0.0,
+        # time of driver per point, with sequential sweep it is everything except the solver
+        'overhead': (elapsed - solver_time) / points if args.workers == 0 else sum(latencies) / points,
+        'latency_p50': percentile(latencies, 0.5),
+        'latency_p95': percentile(latencies, 0.95),
+        'errors': errors,
+    }
+
+
+def read_history(filename):
+    history = []
+    if not os.path.isfile(filename):
+        return history
+    with open(filename) as history_file:
+        header = history_file.readline().rstrip('\n').split('\t')
+        for line in history_file:
+            history.append(dict(zip(header, line.rstrip('\n').split('\t'))))
+    return history
+
+
+def same_setup(entry, result):
+    return all(
+        entry.get(c) == str(result[c]) for c in ('case', 'points', 'workers', 'delay', 'field', 'detector')
+    )
+
+
+def write_history(filename, result):
+    new_file = not os.path.isfile(filename)
+    if os.path.dirname(filename):
+        os.makedirs(os.path.dirname(filename), exist_ok=True)
+    with open(filename, 'a') as history_file:
+        if new_file:
+            history_file.write('\t'.join(history_columns) + '\n')
+        history_file.write('\t'.join(
+            '{:.6f}'.format(result[c]) if type(result[c]) is float and c != 'delay' else str(result[c])
+            for c in history_columns
+        ) + '\n')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark of testlib2 overhead with a stand-in solver.')
+    parser.add_argument('--solver', action='store_true', help=argparse.SUPPRESS)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[100, 1000, 10000], help='points in every sweep')
+    parser.add_argument('--cases', nargs='+', default=[c for c, _ in cases], choices=[c for c, _ in cases])
+    parser.add_argument('--delay', type=float, default=0.0, help='seconds of every solver run')
+    parser.add_argument('--field', default='100x100', help='rows x columns of Ez.txt')
+    parser.add_argument('--detector', type=int, default=1000, help='rows of detector_filtered_field.txt')
+    parser.add_argument('--workers', type=int, default=0, help='parallel_parameters_test with this number of workers')
+    parser.add_argument('--history', default=history_filename, help='file with history of benchmarks')
+    parser.add_argument('--keep', action='store_true', help='keep results of sweeps in work dir')
+    parser.add_argument('--work-dir', help='directory for solution and results, temporary by default')
+    args = parser.parse_args()
+
+    if args.solver:
+        solver()
+        return 0
+
+    # history is written after chdir into directory of solver, so relative paths are resolved here
+    args.history = os.path.abspath(args.history)
+    work_dir = args.work_dir or tempfile.mkdtemp(prefix='testlib2_benchmark_')
+    history = read_history(args.history)
+    date = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime())
+    rev = revision()
+    errors = 0
+
+    cwd = os.getcwd()
+    try:
+        solution_dir = prepare(work_dir, args)
+        # sequential sweeps execute the program in current directory, as in experiments
+        os.chdir(solution_dir)
+        for name, dimensions in cases:
+            if name not in args.cases:
+                continue
+            for size in args.sizes:
+                result = run_case(name, dimensions, size, args, work_dir)
+                result['date'] = date
+                result['revision'] = rev
+                errors += result['errors']
+
+                previous = [entry for entry in history if same_setup(entry, result)]
+                change = ''
+                if previous:
+                    before = float(previous[-1]['points_per_second'])
+                    change = ' ({:+.1%} to {})'.format(
+                        result['points_per_second'] / before - 1 if before > 0 else 0.0,
+                        previous[-1]['revision'] or previous[-1]['date']
+                    )
+                print('{case} {points} points: {elapsed:.2f} s, {points_per_second:.1f} points/s{change}, '
+                      'overhead {overhead_ms:.2f} ms/point, latency p50 {p50:.2f} ms, p95 {p95:.2f} ms.'.format(
+                          change=change, overhead_ms=result['overhead'] * 1000,
+                          p50=result['latency_p50'] * 1000, p95=result['latency_p95'] * 1000, **result
+                      ))
+                if result['errors'] != 0:
+                    print('[ERROR] {} errors, see {}.'.format(
+                        result['errors'], os.path.join(work_dir, 'benchmark_log.txt')
+                    ))
+                write_history(args.history, result)
+    finally:
+        os.chdir(cwd)
+        if args.work_dir is None and not args.keep:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    return 1 if errors != 0 else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -7,6 +7,7 @@
 from testlib2 import *
 
 start_time = time.time()
+# import testlib2; testlib2.log_buffered = True; testlib2.log_structured = True  # logs of all levels of tests are written in background as JSON lines
 log = Log('ExperimentsLog.txt')
 log.sep()
 
@@ -17,8 +18,29 @@ FlucJcen	= Parameter('FlucJcen', 1100, 1200, step=10)
 n_parameters_test(FlucJcen, FlucIcen, log=log.q)
 
 # For tests
+# import resultreader  # reducers and metrics of the examples below
 # set_parameter('FlucNe0', 0.3e19)
 # n_parameters_test(FlucIcen, FlucJcen, log=log.q)
+# parallel_parameters_test(FlucJcen, FlucIcen, workers=8, log=log.q)
+# sweep_parameters_test(FlucJcen, FlucIcen, workers='auto', scheduler=Scheduler(resources=Resources(cpus_per_run=4, memory='auto')), log=log.q)
+# sweep_parameters_test(FlucJcen, FlucIcen, dry_run=True, run_time=1800, workers=8, log=log.q)
+# sweep_parameters_test(FlucJcen, FlucIcen, workers=8, order=lambda point: -dict(point)['FlucJcen'], log=log.q)
+# shard_parameters_test(FlucJcen, FlucIcen, res_dir='\\\\server\\Results\\<test>', workers=4, wait=True, log=log.q)  # on every host, then merge_shards(res_dir)
+# sweep_parameters_test(FlucJcen, FlucIcen, workers=8, maps={'SD_max': (resultreader.maximum, 'det_SD.txt'), 'RC_energy': (resultreader.energy, 'RC_Line.txt')}, log=log.q)
+# n_parameters_test(FlucJcen, FlucIcen, log=log.q, status=True)  # progress on http://127.0.0.1:8765/ and /metrics
+# n_parameters_test(FlucJcen, FlucIcen, log=log.q, scheduler=Scheduler(timeout=6 * 3600, stall_timeout=1800, retries=2))
+# n_parameters_test(FlucJcen, FlucIcen, log=log.q, scheduler=Scheduler(monitor=Monitor(NonFinite('deb.txt'), Limit('detector_filtered_field.txt', 1e6), SteadyState('detector_filtered_field.txt', window=500, tolerance=1e-3), Pattern('log.txt', r'(?i)error'), run_time=3 * 3600)))
+# n_parameters_test(FlucJcen, FlucIcen, log=log.q, res_dir='D:\\Avt63\\Results\\<interrupted test>', resume=True)
+# n_parameters_test(FlucJcen, FlucIcen, log=log.q, cache=ResultCache(size_limit=50 * 1024 ** 3))
+# n_parameters_test(FlucJcen, FlucIcen, log=log.q, store=True, store_files=['det_SD.txt', 'RC_Line.txt'])
+# sweep_parameters_test(FlucJcen, FlucIcen, workers=8, pack=True, log=log.q)  # python resultarchive.py unpack <test> restores files
+# parallel_parameters_test(FlucJcen, FlucIcen, workers=8, log=log.q, metrics=True)
+# n_parameters_test(FlucJcen, FlucIcen, log=log.q, archive=Archiver(workers=2, queue_size=4))
+# RunIndex('D:\\Avt63\\Results\\index.sqlite').find(FlucIcen=250, FlucJcen=(1100, 1150))  # runs of all tests, python runindex.py D:\Avt63\Results rebuilds it
+# SweepResults('D:\\Avt63\\Results\\<test>', FlucJcen, FlucIcen).sel(FlucJcen=1150, FlucIcen=slice(200, 250)).map(max, 'det_SD.txt')  # from sweepresults import SweepResults
+# adaptive_parameters_test(lambda d, i: resultreader.maximum(os.path.join(d, '{}_det_CF.txt'.format(i))), FlucJcen, FlucIcen, coarse=5, tolerance=0.05, budget=40, log=log.q)
+# screening_parameters_test(lambda d, i: resultreader.maximum(os.path.join(d, '{}_det_SD.txt'.format(i))), FlucJcen, FlucIcen, low={'FlucNe0': 0.3e19}, fraction=0.1, workers=8, log=log.q)
+# best, evaluations = optimize_parameters(lambda d, i: resultreader.maximum(os.path.join(d, '{}_RC_Line.txt'.format(i))), Parameter('FlucIcen', 200, 300, step=1), Parameter('FlucJcen', 1100, 1200, step=1), budget=20, maximize=True, log=log.q)
 # parameter_test(Parameter('FlucBuild', 0, 0, n=1), log=log.q)
 
 finish_time = time.time()
@@ -0,0 +1,359 @@
+# -*- coding: UTF-8 -*-
+
+# Content addressed archive of results of test:
+#
+#   python resultarchive.py pack D:\Avt63\Results\<test>      files of runs are stored once by hash and removed
+#   python resultarchive.py unpack D:\Avt63\Results\<test>    files of runs are restored
+#
+# Archived results are still read by their paths through resultreader, runindex and sweepresults.
+
+import io
+import os
+import re
+import sys
+import json
+import zlib
+import errno
+import sqlite3
+import hashlib
+import difflib
+import threading
+
+
+# Name of file with index of archive and of directory with contents of files, they are kept in root of archive
+archive_filename = 'archive.sqlite'
+objects_dirname = 'objects'
+
+# Files of runs are {i}_{name}, copies of settings are stored as differences from the first one
+result_re = re.compile(r'^(\d+)_(.+)$')
+settings_filename = 'Settings.ini'
+
+block_size = 1024 * 1024
+
+open_archives = {}
+open_archives_lock = threading.Lock()
+
+
+class ObjectReader(io.RawIOBase):
+    # contents of object are decompressed while they are read, so large files are never kept in memory entirely
+
+    def __init__(self, filename):
+        self.object_file = open(filename, 'rb')
+        self.decompressor = zlib.decompressobj()
+        self.buffer = b''
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+        while not self.buffer:
+            data = self.object_file.read(block_size)
+            if not data:
+                self.buffer = self.decompressor.flush()
+                break
+            self.buffer = self.decompressor.decompress(data)
+        n = min(len(b), len(self.buffer))
+        b[:n] = self.buffer[:n]
+        self.buffer = self.buffer[n:]
+        return n
+
+    def close(self):
+        self.object_file.close()
+        io.RawIOBase.close(self)
+
+
+class ResultArchive:
+
+    def __init__(self, root):
+        self.root = os.path.abspath(root)
+        self.objects_dir = os.path.join(self.root, objects_dirname)
+        self.lock = threading.Lock()
+        self.base = None
+
+        self.db = sqlite3.connect(os.path.join(self.root, archive_filename), timeout=60, check_same_thread=False)
+        self.db.executescript('''
+            CREATE TABLE IF NOT EXISTS meta (
+                name TEXT PRIMARY KEY,
+                value TEXT
+            );
+            CREATE TABLE IF NOT EXISTS objects (
+                hash TEXT PRIMARY KEY,
+                size INTEGER,
+                stored INTEGER
+            );
+            CREATE TABLE IF NOT EXISTS files (
+                path TEXT PRIMARY KEY,
+                hash TEXT,
+                size INTEGER,
+                delta TEXT
+            );
+        ''')
+        self.db.commit()
+
+    def __del__(self):
+        self.close()
+
+    def key(self, path):
+        return os.path.relpath(os.path.abspath(path), self.root).replace(os.sep, '/')
+
+    def object_path(self, h):
+        return os.path.join(self.objects_dir, h[:2], h)
+
+    def store_object(self, filename):
+        # contents are hashed first, so the same contents are compressed and written only once
+        h = hashlib.sha256()
+        size = 0
+        with open(filename, 'rb') as source:
+            for block in iter(lambda: source.read(block_size), b''):
+                h.update(block)
+                size += len(block)
+        h = h.hexdigest()
+
+        with self.lock:
+            if self.db.execute('SELECT 1 FROM objects WHERE hash = ?', (h,)).fetchone() is not None:
+                return h, size
+
+        destination = self.object_path(h)
+        os.makedirs(os.path.dirname(destination), exist_ok=True)
+        temp = '{}.tmp{}_{}'.format(destination, os.getpid(), threading.get_ident())
+        compressor = zlib.compressobj(6)
+        with open(filename, 'rb') as source, open(temp, 'wb') as object_file:
+            for block in iter(lambda: source.read(block_size), b''):
+                object_file.write(compressor.compress(block))
+            object_file.write(compressor.flush())
+        os.replace(temp, destination)
+
+        with self.lock:
+            self.db.execute(
+                'INSERT OR IGNORE INTO objects (hash, size, stored) VALUES (?, ?, ?)',
+                (h, size, os.path.getsize(destination))
+            )
+            self.db.commit()
+        return h, size
+
+    def object_bytes(self, h):
+        with io.BufferedReader(ObjectReader(self.object_path(h))) as object_file:
+            return object_file.read()
+
+    def settings_base(self, filename):
+        # the first settings file of archive is the base of all the others
+        with self.lock:
+            row = self.db.execute('SELECT value FROM meta WHERE name = ?', ('settings_base',)).fetchone()
+        if row is None:
+            h, _ = self.store_object(filename)
+            with self.lock:
+                self.db.execute('INSERT OR IGNORE INTO meta (name, value) VALUES (?, ?)', ('settings_base', h))
+                self.db.commit()
+                row = self.db.execute('SELECT value FROM meta WHERE name = ?', ('settings_base',)).fetchone()
+        if self.base is None or self.base[0] != row[0]:
+            self.base = (row[0], self.object_bytes(row[0]).splitlines(True))
+        return self.base
+
+    def add(self, path):
+        # settings are stored as changed lines of base, other files as objects; repeated file replaces the record
+        match = result_re.match(os.path.basename(path))
+        delta = None
+        if match is not None and match.group(2) == settings_filename:
+            h, base = self.settings_base(path)
+            with open(path, 'rb') as settings_file:
+                lines = settings_file.read().splitlines(True)
+            size = sum(len(line) for line in lines)
+            # lines are kept as latin-1 text, so any bytes are restored exactly
+            delta = json.dumps([
+                [i1, i2, [line.decode('latin-1') for line in lines[j1:j2]]]
+                for tag, i1, i2, j1, j2 in difflib.SequenceMatcher(None, base, lines, False).get_opcodes()
+                if tag != 'equal'
+            ])
+        else:
+            h, size = self.store_object(path)
+
+        with self.lock:
+            self.db.execute(
+                'INSERT OR REPLACE INTO files (path, hash, size, delta) VALUES (?, ?, ?, ?)',
+                (self.key(path), h, size, delta)
+            )
+            self.db.commit()
+
+    def record(self, path):
+        with self.lock:
+            return self.db.execute(
+                'SELECT hash, size, delta FROM files WHERE path = ?', (self.key(path),)
+            ).fetchone()
+
+    def open(self, path):
+        # file object of archived file, None if it is not in archive
+        row = self.record(path)
+        if row is None:
+            return None
+        h, _, delta = row
+        if delta is None:
+            return io.BufferedReader(ObjectReader(self.object_path(h)))
+
+        base = self.object_bytes(h).splitlines(True)
+        lines = []
+        k = 0
+        for i1, i2, changed in json.loads(delta):
+            lines += base[k:i1]
+            lines += [line.encode('latin-1') for line in changed]
+            k = i2
+        lines += base[k:]
+        return io.BytesIO(b''.join(lines))
+
+    def listdir(self, directory):
+        prefix = self.key(directory) + '/'
+        if prefix == './':
+            prefix = ''
+        with self.lock:
+            paths = [row[0] for row in self.db.execute(
+                'SELECT path FROM files WHERE substr(path, 1, ?) = ?', (len(prefix), prefix)
+            )]
+        return [path[len(prefix):] for path in paths if '/' not in path[len(prefix):]]
+
+    def paths(self):
+        with self.lock:
+            return [row[0] for row in self.db.execute('SELECT path FROM files ORDER BY path')]
+
+    def summary(self):
+        with self.lock:
+            files, size = self.db.execute('SELECT count(*), coalesce(sum(size), 0) FROM files').fetchone()
+            objects, stored = self.db.execute('SELECT count(*), coalesce(sum(stored), 0) FROM objects').fetchone()
+            deltas = self.db.execute(
+                'SELECT coalesce(sum(length(delta)), 0) FROM files WHERE delta IS NOT NULL'
+            ).fetchone()[0]
+        return {'files': files, 'size': size, 'objects': objects, 'stored': stored + deltas}
+
+    def close(self):
+        with self.lock:
+            if self.db is not None:
+                self.db.close()
+                self.db = None
+
+
+def open_archive(root):
+    root = os.path.abspath(root)
+    with open_archives_lock:
+        if root not in open_archives:
+            open_archives[root] = ResultArchive(root)
+        return open_archives[root]
+
+
+def close_archive(root):
+    with open_archives_lock:
+        archive = open_archives.pop(os.path.abspath(root), None)
+    if archive is not None:
+        archive.close()
+
+
+def find_archive(path):
+    # archive of file is kept in one of parent directories of the file
+    directory = os.path.dirname(os.path.abspath(path))
+    while True:
+        if os.path.isfile(os.path.join(directory, archive_filename)):
+            return open_archive(directory)
+        parent = os.path.dirname(directory)
+        if parent == directory:
+            return None
+        directory = parent
+
+
+def open_result(filename):
+    # binary file of results by its path, from disk or from archive
+    if os.path.isfile(filename):
+        return open(filename, 'rb')
+    archive = find_archive(filename)
+    result_file = archive.open(filename) if archive is not None else None
+    if result_file is None:
+        raise FileNotFoundError(errno.ENOENT, os.strerror(errno.ENOENT), filename)
+    return result_file
+
+
+def exists(filename):
+    if os.path.isfile(filename):
+        return True
+    archive = find_archive(filename)
+    return archive is not None and archive.record(filename) is not None
+
+
+def version(filename):
+    # changes when contents of file are changed: time and size of file on disk, hash and delta in archive
+    try:
+        stat = os.stat(filename)
+        return stat.st_mtime, stat.st_size
+    except OSError:
+        archive = find_archive(filename)
+        row = archive.record(filename) if archive is not None else None
+        if row is None:
+            raise
+        return row
+
+
+def listdir(directory):
+    names = set(os.listdir(directory)) if os.path.isdir(directory) else set()
+    archive = find_archive(os.path.join(directory, archive_filename))
+    if archive is not None:
+        names.update(archive.listdir(directory))
+    return sorted(names)
+
+
+def pack_results(root, log=print, keep=False):
+    # files of runs ({i}_*) under root are moved into archive, other files (logs, journals, tables) are kept
+    errors = 0
+    archive = open_archive(root)
+    packed = 0
+    for directory, dirs, filenames in os.walk(root):
+        if os.path.abspath(directory) == archive.root and objects_dirname in dirs:
+            dirs.remove(objects_dirname)
+        for filename in filenames:
+            if result_re.match(filename) is None:
+                continue
+            path = os.path.join(directory, filename)
+            try:
+                archive.add(path)
+                if not keep:
+                    os.remove(path)
+                packed += 1
+            except Exception as e:
+                log('[ERROR] Cannot add file ({}) into archive ({}) - UnErr ({}).'.format(path, archive.root, e))
+                errors += 1
+
+    s = archive.summary()
+    log('{} files are packed. Archive: {} files ({} bytes) are stored in {} objects ({} bytes).'.format(
+        packed, s['files'], s['size'], s['objects'], s['stored']
+    ))
+    return errors
+
+
+def unpack_results(root, log=print):
+    # all files are restored, archive is removed if there are no errors
+    errors = 0
+    archive = open_archive(root)
+    paths = archive.paths()
+    for path in paths:
+        filename = os.path.join(archive.root, *path.split('/'))
+        try:
+            os.makedirs(os.path.dirname(filename), exist_ok=True)
+            with archive.open(filename) as source, open(filename, 'wb') as destination:
+                for block in iter(lambda: source.read(block_size), b''):
+                    destination.write(block)
+        except Exception as e:
+            log('[ERROR] Cannot restore file ({}) from archive ({}) - UnErr ({}).'.format(filename, archive.root, e))
+            errors += 1
+
+    if errors == 0:
+        close_archive(root)
+        os.remove(os.path.join(archive.root, archive_filename))
+        for directory, _, filenames in os.walk(archive.objects_dir, topdown=False):
+            for filename in filenames:
+                os.remove(os.path.join(directory, filename))
+            os.rmdir(directory)
+    log('{} files are restored from archive. {} errors.'.format(len(paths) - errors, errors))
+    return errors
+
+
+if __name__ == '__main__':
+    if len(sys.argv) != 3 or sys.argv[1] not in ('pack', 'unpack'):
+        print('Usage: python resultarchive.py pack|unpack <directory for results of test>')
+        sys.exit(2)
+    if sys.argv[1] == 'pack':
+        sys.exit(1 if pack_results(sys.argv[2]) != 0 else 0)
+    sys.exit(1 if unpack_results(sys.argv[2]) != 0 else 0)
@@ -0,0 +1,112 @@
+# -*- coding: UTF-8 -*-
+
+import os
+import mmap
+
+from resultarchive import open_result
+
+
+# Size of blocks read from text files of program
+chunk_size = 4 * 1024 * 1024
+
+# Values are separated by spaces, tabs, commas or semicolons
+separators = bytes.maketrans(b',;', b'  ')
+
+
+def parse_row(line):
+    fields = line.translate(separators).split()
+    if not fields:
+        return None
+    try:
+        return [float(field) for field in fields]
+    except ValueError:
+        # headers and other text lines are skipped
+        return None
+
+
+def lines(filename, size=None, mapped=False):
+    # lines of file as bytes, only one block of file is kept in memory; archived files are never mapped
+    with open_result(filename) as text_file:
+        if mapped and os.path.isfile(filename):
+            try:
+                data = mmap.mmap(text_file.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError:
+                # empty file can not be mapped
+                return
+            with data:
+                for line in iter(data.readline, b''):
+                    yield line
+            return
+
+        rest = b''
+        for block in iter(lambda: text_file.read(size or chunk_size), b''):
+            block = rest + block
+            end = block.rfind(b'\n') + 1
+            rest = block[end:]
+            for line in block[:end].splitlines():
+                yield line
+        if rest:
+            yield rest
+
+
+def rows(filename, size=None, mapped=False):
+    for line in lines(filename, size, mapped):
+        row = parse_row(line)
+        if row is not None:
+            yield row
+
+
+def frames(filename, frame_rows=None, size=None, mapped=False):
+    # frames are separated by empty lines or contain frame_rows rows each
+    frame = []
+    for line in lines(filename, size, mapped):
+        row = parse_row(line)
+        if row is None:
+            if frame_rows is None and frame and not line.strip():
+                yield frame
+                frame = []
+            continue
+        frame.append(row)
+        if frame_rows is not None and len(frame) == frame_rows:
+            yield frame
+            frame = []
+    if frame:
+        yield frame
+
+
+def maximum(filename, absolute=True, column=None, **kwargs):
+    res = None
+    for row in rows(filename, **kwargs):
+        values = row if column is None else row[column:column + 1]
+        for value in values:
+            if absolute:
+                value = abs(value)
+            if res is None or value > res:
+                res = value
+    return res
+
+
+def energy(filename, column=None, **kwargs):
+    # sum of squares of values, of one column if it is given
+    res = 0.0
+    for row in rows(filename, **kwargs):
+        values = row if column is None else row[column:column + 1]
+        for value in values:
+            res += value * value
+    return res
+
+
+def frame_energies(filename, frame_rows=None, **kwargs):
+    for frame in frames(filename, frame_rows, **kwargs):
+        yield sum(value * value for row in frame for value in row)
+
+
+def detector_line(filename, row=None, column=None, frame_rows=None, **kwargs):
+    # values along detector line in every frame: one row or one column of frame
+    if (row is None) == (column is None):
+        raise ValueError('detector_line(): exactly one of row and column is expected')
+    for frame in frames(filename, frame_rows, **kwargs):
+        if row is not None:
+            yield frame[row] if -len(frame) <= row < len(frame) else []
+        else:
+            yield [r[column] for r in frame if -len(r) <= column < len(r)]
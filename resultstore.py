@@ -0,0 +1,211 @@
+# -*- coding: UTF-8 -*-
+
+import os
+import sys
+import zlib
+import sqlite3
+import threading
+from array import array
+
+from resultreader import rows as text_rows
+
+
+# Name of file with consolidated results, it is kept in directory for results
+store_filename = 'results.sqlite'
+
+# Arrays are stored as little-endian doubles
+swap_bytes = sys.byteorder != 'little'
+
+
+class ResultStore:
+
+    def __init__(self, filename, chunk_rows=4096, level=6):
+        self.filename = filename
+        self.chunk_rows = chunk_rows
+        self.level = level
+        self.lock = threading.Lock()
+
+        self.db = sqlite3.connect(self.filename, check_same_thread=False)
+        self.db.executescript('''
+            CREATE TABLE IF NOT EXISTS meta (
+                name TEXT PRIMARY KEY,
+                value TEXT
+            );
+            CREATE TABLE IF NOT EXISTS runs (
+                run INTEGER PRIMARY KEY,
+                key TEXT UNIQUE,
+                directory TEXT,
+                i INTEGER
+            );
+            CREATE TABLE IF NOT EXISTS coords (
+                run INTEGER,
+                name TEXT,
+                value REAL,
+                text TEXT
+            );
+            CREATE INDEX IF NOT EXISTS coords_value ON coords (name, value);
+            CREATE TABLE IF NOT EXISTS arrays (
+                run INTEGER,
+                file TEXT,
+                rows INTEGER,
+                cols INTEGER,
+                PRIMARY KEY (run, file)
+            );
+            CREATE TABLE IF NOT EXISTS chunks (
+                run INTEGER,
+                file TEXT,
+                chunk INTEGER,
+                data BLOB,
+                PRIMARY KEY (run, file, chunk)
+            );
+        ''')
+
+        # size of chunks is fixed when store is created
+        self.db.execute('INSERT OR IGNORE INTO meta (name, value) VALUES (?, ?)', ('chunk_rows', str(chunk_rows)))
+        self.chunk_rows = int(self.db.execute('SELECT value FROM meta WHERE name = ?', ('chunk_rows',)).fetchone()[0])
+        self.db.commit()
+
+    def __del__(self):
+        self.close()
+
+    @staticmethod
+    def point_key(point):
+        return ';'.join('{}={}'.format(name, value) for name, value in point)
+
+    def add_run(self, point, directory=None, i=None):
+        key = self.point_key(point)
+        with self.lock:
+            row = self.db.execute('SELECT run FROM runs WHERE key = ?', (key,)).fetchone()
+            if row is not None:
+                # repeated run replaces arrays stored before
+                run = row[0]
+                self.db.execute('DELETE FROM arrays WHERE run = ?', (run,))
+                self.db.execute('DELETE FROM chunks WHERE run = ?', (run,))
+                self.db.execute('UPDATE runs SET directory = ?, i = ? WHERE run = ?', (directory, i, run))
+            else:
+                run = self.db.execute(
+                    'INSERT INTO runs (key, directory, i) VALUES (?, ?, ?)', (key, directory, i)
+                ).lastrowid
+                for name, value in point:
+                    number = value if type(value) in (int, float) else None
+                    self.db.execute(
+                        'INSERT INTO coords (run, name, value, text) VALUES (?, ?, ?, ?)',
+                        (run, name, number, str(value))
+                    )
+            self.db.commit()
+        return run
+
+    def add_array(self, run, name, rows):
+        # rows are compressed and written by chunks, so large files are never kept in memory entirely
+        n = 0
+        cols = None
+        chunk = array('d')
+        chunk_n = 0
+
+        with self.lock:
+            for row in rows:
+                if cols is None:
+                    cols = len(row)
+                elif cols != len(row):
+                    # ragged rows are stored as a flat sequence of values
+                    cols = 0
+                chunk.extend(row)
+                n += 1
+                if n % self.chunk_rows == 0:
+                    self.write_chunk(run, name, chunk_n, chunk)
+                    chunk = array('d')
+                    chunk_n += 1
+            if len(chunk):
+                self.write_chunk(run, name, chunk_n, chunk)
+
+            self.db.execute(
+                'INSERT OR REPLACE INTO arrays (run, file, rows, cols) VALUES (?, ?, ?, ?)',
+                (run, name, n, cols or 0)
+            )
+            self.db.commit()
+        return n
+
+    def write_chunk(self, run, name, chunk_n, chunk):
+        if swap_bytes:
+            chunk.byteswap()
+        self.db.execute(
+            'INSERT OR REPLACE INTO chunks (run, file, chunk, data) VALUES (?, ?, ?, ?)',
+            (run, name, chunk_n, zlib.compress(chunk.tobytes(), self.level))
+        )
+
+    def ingest(self, point, directory, i, files, log=print):
+        run = self.add_run(point, directory, i)
+        errors = 0
+        for filename in files:
+            source = os.path.join(directory, '{}_{}'.format(i, filename))
+            if not os.path.isfile(source):
+                continue
+            try:
+                self.add_array(run, filename, text_rows(source))
+            except Exception as e:
+                log('[ERROR] Cannot add results ({}) into store ({}) - UnErr ({}).'.format(source, self.filename, e))
+                errors += 1
+        return errors
+
+    def runs(self, **values):
+        # numbers of runs selected by values of parameters, e.g. runs(FlucIcen=250)
+        query = 'SELECT run FROM runs'
+        args = []
+        for name, value in values.items():
+            query += ' INTERSECT SELECT run FROM coords WHERE name = ? AND {} = ?'.format(
+                'value' if type(value) in (int, float) else 'text'
+            )
+            args += [name, value]
+        with self.lock:
+            return [row[0] for row in self.db.execute(query + ' ORDER BY 1', args)]
+
+    def point(self, run):
+        with self.lock:
+            return tuple(self.db.execute('SELECT name, text FROM coords WHERE run = ? ORDER BY rowid', (run,)))
+
+    def files(self, run):
+        with self.lock:
+            return [row[0] for row in self.db.execute('SELECT file FROM arrays WHERE run = ? ORDER BY file', (run,))]
+
+    def shape(self, run, name):
+        with self.lock:
+            row = self.db.execute('SELECT rows, cols FROM arrays WHERE run = ? AND file = ?', (run, name)).fetchone()
+        if row is None:
+            raise KeyError('ResultStore(): file {} of run {} is not found'.format(name, run))
+        return row
+
+    def get(self, run, name, begin=0, end=None):
+        # rows [begin, end) of array, only the chunks containing them are read and decompressed
+        rows, cols = self.shape(run, name)
+        end = rows if end is None else min(end, rows)
+
+        res = array('d')
+        if begin >= end:
+            return res
+        if cols == 0:
+            # ragged array is always read entirely
+            begin, end = 0, rows
+        first = begin // self.chunk_rows
+        last = (end - 1) // self.chunk_rows
+        with self.lock:
+            chunks = self.db.execute(
+                'SELECT chunk, data FROM chunks WHERE run = ? AND file = ? AND chunk BETWEEN ? AND ? ORDER BY chunk',
+                (run, name, first, last)
+            ).fetchall()
+        for chunk_n, data in chunks:
+            chunk = array('d')
+            chunk.frombytes(zlib.decompress(data))
+            if swap_bytes:
+                chunk.byteswap()
+            if cols == 0:
+                res.extend(chunk)
+            else:
+                offset = chunk_n * self.chunk_rows
+                res.extend(chunk[max(begin - offset, 0) * cols:(end - offset) * cols])
+        return res
+
+    def close(self):
+        with self.lock:
+            if self.db is not None:
+                self.db.close()
+                self.db = None
@@ -0,0 +1,333 @@
+# -*- coding: UTF-8 -*-
+
+# Index of all runs in a root directory for results:
+#
+#   python runindex.py D:\Avt63\Results       rebuilds index.sqlite from existing result trees
+
+import os
+import re
+import sys
+import time
+import sqlite3
+import hashlib
+import threading
+
+from resultarchive import open_result, exists, listdir
+
+
+# Name of file with index of runs, it is kept in root directory for results
+index_filename = 'index.sqlite'
+
+# Files of journal and settings written by testlib2
+journal_filename = 'journal.txt'
+settings_filename = 'Settings.ini'
+
+settings_re = re.compile(r'^(\w+)\s*=\s*([\w\+\-\.]*)', re.M)
+result_re = re.compile(r'^(\d+)_(.+)$')
+
+
+def file_hash(filename):
+    h = hashlib.sha256()
+    with open_result(filename) as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            h.update(block)
+    return h.hexdigest()
+
+
+def number(text):
+    # values of parameters are compared as numbers when it is possible
+    try:
+        return float(text)
+    except (TypeError, ValueError):
+        return None
+
+
+class RunIndex:
+
+    def __init__(self, filename):
+        self.filename = filename
+        self.root = os.path.dirname(os.path.abspath(filename))
+        self.lock = threading.Lock()
+
+        self.db = sqlite3.connect(self.filename, timeout=60, check_same_thread=False)
+        self.db.executescript('''
+            CREATE TABLE IF NOT EXISTS runs (
+                run INTEGER PRIMARY KEY,
+                test TEXT,
+                directory TEXT,
+                i INTEGER,
+                key TEXT,
+                settings_hash TEXT,
+                status TEXT,
+                wall REAL,
+                recorded REAL,
+                UNIQUE (directory, i)
+            );
+            CREATE INDEX IF NOT EXISTS runs_test ON runs (test);
+            CREATE INDEX IF NOT EXISTS runs_settings ON runs (settings_hash);
+            CREATE TABLE IF NOT EXISTS params (
+                run INTEGER,
+                name TEXT,
+                value REAL,
+                text TEXT
+            );
+            CREATE INDEX IF NOT EXISTS params_value ON params (name, value);
+            CREATE INDEX IF NOT EXISTS params_text ON params (name, text);
+            CREATE INDEX IF NOT EXISTS params_run ON params (run);
+            CREATE TABLE IF NOT EXISTS files (
+                run INTEGER,
+                name TEXT,
+                path TEXT,
+                size INTEGER
+            );
+            CREATE INDEX IF NOT EXISTS files_run ON files (run);
+        ''')
+        self.db.commit()
+
+    def __del__(self):
+        self.close()
+
+    def test_of(self, directory):
+        # test is the first directory under the root, runs outside of the root are kept with full path
+        try:
+            relative = os.path.relpath(os.path.abspath(directory), self.root)
+        except ValueError:
+            # directory is on other drive
+            relative = os.pardir
+        if relative.startswith(os.pardir):
+            return os.path.abspath(directory)
+        return re.split(r'[\\/]', relative)[0]
+
+    def add(self, point, directory, i, status='ok', settings_hash=None, wall=None, files=()):
+        # point is ((name, value), ...), files are paths of result files; repeated run replaces the record
+        key = ';'.join('{}={}'.format(name, value) for name, value in point)
+        with self.lock:
+            row = self.db.execute('SELECT run FROM runs WHERE directory = ? AND i = ?', (directory, i)).fetchone()
+            if row is not None:
+                self.db.execute('DELETE FROM params WHERE run = ?', row)
+                self.db.execute('DELETE FROM files WHERE run = ?', row)
+                self.db.execute('DELETE FROM runs WHERE run = ?', row)
+            run = self.db.execute(
+                'INSERT INTO runs (test, directory, i, key, settings_hash, status, wall, recorded) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                (self.test_of(directory), directory, i, key, settings_hash, status, wall, time.time())
+            ).lastrowid
+            self.db.executemany(
+                'INSERT INTO params (run, name, value, text) VALUES (?, ?, ?, ?)',
+                [(run, name, number(value), str(value)) for name, value in point]
+            )
+            self.db.executemany(
+                'INSERT INTO files (run, name, path, size) VALUES (?, ?, ?, ?)',
+                [
+                    (run, result_re.match(os.path.basename(path)).group(2), path,
+                     os.path.getsize(path) if os.path.isfile(path) else None)
+                    for path in files if result_re.match(os.path.basename(path))
+                ]
+            )
+            self.db.commit()
+        return run
+
+    def move(self, directory, i, destination):
+        # record of run follows its results, e.g. when shards are merged; None if the run is not indexed
+        with self.lock:
+            row = self.db.execute('SELECT run FROM runs WHERE directory = ? AND i = ?', (directory, i)).fetchone()
+            if row is None:
+                return None
+            old = self.db.execute(
+                'SELECT run FROM runs WHERE directory = ? AND i = ?', (destination, i)
+            ).fetchone()
+            if old is not None:
+                for table in ('params', 'files', 'runs'):
+                    self.db.execute('DELETE FROM {} WHERE run = ?'.format(table), old)
+            self.db.execute(
+                'UPDATE runs SET directory = ?, test = ? WHERE run = ?', (destination, self.test_of(destination), row[0])
+            )
+            for rowid, path in list(self.db.execute('SELECT rowid, path FROM files WHERE run = ?', row)):
+                self.db.execute(
+                    'UPDATE files SET path = ? WHERE rowid = ?',
+                    (os.path.join(destination, os.path.basename(path)), rowid)
+                )
+            self.db.commit()
+        return row[0]
+
+    def find(self, test=None, status=None, **values):
+        # runs selected by values of parameters, e.g. find(FlucIcen=250, FlucJcen=1150); (low, high) is a range
+        query = 'SELECT run FROM runs WHERE 1'
+        args = []
+        if test is not None:
+            query += ' AND test = ?'
+            args.append(test)
+        if status is not None:
+            query += ' AND status = ?'
+            args.append(status)
+        for name, value in values.items():
+            if isinstance(value, tuple):
+                query += ' AND run IN (SELECT run FROM params WHERE name = ? AND value BETWEEN ? AND ?)'
+                args += [name, value[0], value[1]]
+            elif number(value) is not None:
+                query += ' AND run IN (SELECT run FROM params WHERE name = ? AND value = ?)'
+                args += [name, number(value)]
+            else:
+                query += ' AND run IN (SELECT run FROM params WHERE name = ? AND text = ?)'
+                args += [name, str(value)]
+        with self.lock:
+            runs = [row[0] for row in self.db.execute(query + ' ORDER BY run', args)]
+        return [self.get(run) for run in runs]
+
+    def get(self, run):
+        with self.lock:
+            row = self.db.execute(
+                'SELECT run, test, directory, i, settings_hash, status, wall FROM runs WHERE run = ?', (run,)
+            ).fetchone()
+            if row is None:
+                raise KeyError('RunIndex(): run {} is not found'.format(run))
+            point = tuple(self.db.execute('SELECT name, text FROM params WHERE run = ? ORDER BY rowid', (run,)))
+        return dict(zip(('run', 'test', 'directory', 'i', 'settings_hash', 'status', 'wall'), row), point=point)
+
+    def files(self, run):
+        with self.lock:
+            return dict(self.db.execute('SELECT name, path FROM files WHERE run = ? ORDER BY name', (run,)))
+
+    def same_settings(self, settings_hash):
+        with self.lock:
+            return [row[0] for row in self.db.execute('SELECT run FROM runs WHERE settings_hash = ?', (settings_hash,))]
+
+    def clear(self, test=None):
+        with self.lock:
+            condition = '' if test is None else ' WHERE test = ?'
+            args = () if test is None else (test,)
+            for table in ('params', 'files'):
+                self.db.execute(
+                    'DELETE FROM {} WHERE run IN (SELECT run FROM runs{})'.format(table, condition), args
+                )
+            self.db.execute('DELETE FROM runs' + condition, args)
+            self.db.commit()
+
+    def close(self):
+        with self.lock:
+            if self.db is not None:
+                self.db.close()
+                self.db = None
+
+
+def read_settings(filename):
+    with open_result(filename) as settings_file:
+        return dict(settings_re.findall(settings_file.read().decode()))
+
+
+def scan_directory(directory):
+    # results of directory grouped by index of run: {i: [paths]}, archived results are included
+    runs = {}
+    for filename in listdir(directory):
+        match = result_re.match(filename)
+        if match is not None and exists(os.path.join(directory, filename)):
+            runs.setdefault(int(match.group(1)), []).append(os.path.join(directory, filename))
+    return runs
+
+
+def relative_parts(path):
+    return tuple(part for part in re.split(r'[\\/]', path) if part not in ('', os.curdir))
+
+
+def directory_point(test_dir, directory):
+    # outer parameters are the name=value directories between test and results
+    point = []
+    for part in relative_parts(os.path.relpath(directory, test_dir)):
+        # directories of coordinates_test_* are named {timestamp}_..._{name}={value}
+        match = re.search(r'(\w+)=([^=\\/]+)$', part)
+        if match is not None:
+            point.append((match.group(1), match.group(2)))
+    return point
+
+
+def read_journal(test_dir):
+    # points of journal by directory inside the test and index of run, the tree could be moved
+    journal = {}
+    journal_path = os.path.join(test_dir, journal_filename)
+    if not os.path.isfile(journal_path):
+        return journal
+    test = os.path.basename(os.path.normpath(test_dir))
+    with open(journal_path) as journal_file:
+        for line in journal_file:
+            fields = line.rstrip('\n').split('\t')
+            if len(fields) == 3 and test in fields[1]:
+                inner = fields[1][fields[1].rfind(test) + len(test):]
+                journal[(relative_parts(inner), int(fields[2]))] = [
+                    tuple(item.split('=', 1)) for item in fields[0].split(';') if '=' in item
+                ]
+    return journal
+
+
+def directory_points(test_dir, directory, results, journal, log=print):
+    # points of runs in directory: from journal, otherwise from name=value directories and from the parameter
+    # which differs between settings files of the directory
+    errors = 0
+    outer = directory_point(test_dir, directory)
+
+    settings = {}
+    for i, paths in results.items():
+        path = os.path.join(directory, '{}_{}'.format(i, settings_filename))
+        if path in paths:
+            try:
+                settings[i] = read_settings(path)
+            except (OSError, UnicodeDecodeError) as e:
+                log('[ERROR] Cannot read settings file ({}) - UnErr ({}).'.format(path, e))
+                errors += 1
+    names = set(name for values in settings.values() for name in values)
+    varied = sorted(
+        name for name in names
+        if len(set(values.get(name) for values in settings.values())) > 1
+        and name not in dict(outer)
+    )
+
+    points = {}
+    inner = relative_parts(os.path.relpath(directory, test_dir))
+    for i in results:
+        point = journal.get((inner, i))
+        if point is None:
+            point = outer + [(name, settings.get(i, {}).get(name)) for name in varied]
+        points[i] = point
+    return points, errors
+
+
+def rebuild(root, log=print):
+    # every test directory under root is read again: points are taken from its journal if it exists, otherwise
+    # from name=value directories and from the parameter which differs between settings files of one directory
+    errors = 0
+    index = RunIndex(os.path.join(root, index_filename))
+    index.clear()
+
+    runs = 0
+    for test in sorted(os.listdir(root)):
+        test_dir = os.path.join(root, test)
+        if not os.path.isdir(test_dir):
+            continue
+
+        journal = read_journal(test_dir)
+        for directory, _, _ in os.walk(test_dir):
+            results = scan_directory(directory)
+            if not results:
+                continue
+            points, res = directory_points(test_dir, directory, results, journal, log)
+            errors += res
+
+            for i, paths in sorted(results.items()):
+                settings_path = os.path.join(directory, '{}_{}'.format(i, settings_filename))
+                index.add(
+                    points[i], directory, i, status='ok',
+                    settings_hash=file_hash(settings_path) if settings_path in paths else None,
+                    files=[path for path in paths if path != settings_path]
+                )
+                runs += 1
+        log('Test {} is indexed.'.format(test))
+
+    index.close()
+    log('{} runs are indexed in {}. {} errors.'.format(runs, os.path.join(root, index_filename), errors))
+    return errors
+
+
+if __name__ == '__main__':
+    if len(sys.argv) != 2:
+        print('Usage: python runindex.py <root directory for results>')
+        sys.exit(2)
+    sys.exit(1 if rebuild(sys.argv[1]) != 0 else 0)
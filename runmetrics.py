@@ -0,0 +1,214 @@
+# -*- coding: UTF-8 -*-
+
+import os
+import sys
+import time
+import shutil
+import threading
+import subprocess
+
+
+# Name of file with metrics of runs, it is kept in directory for results
+metrics_filename = 'metrics.txt'
+
+# Program is bound to cpus by taskset (util-linux) when it is found
+taskset = shutil.which('taskset')
+
+if os.name == 'nt':
+    import ctypes
+    from ctypes import wintypes
+
+    class FILETIME(ctypes.Structure):
+        _fields_ = [('low', wintypes.DWORD), ('high', wintypes.DWORD)]
+
+        def seconds(self):
+            return ((self.high << 32) + self.low) / 1e7
+
+    class PROCESS_MEMORY_COUNTERS(ctypes.Structure):
+        _fields_ = [('cb', wintypes.DWORD), ('PageFaultCount', wintypes.DWORD)] + [
+            (name, ctypes.c_size_t) for name in (
+                'PeakWorkingSetSize', 'WorkingSetSize', 'QuotaPeakPagedPoolUsage', 'QuotaPagedPoolUsage',
+                'QuotaPeakNonPagedPoolUsage', 'QuotaNonPagedPoolUsage', 'PagefileUsage', 'PeakPagefileUsage'
+            )
+        ]
+
+    class IO_COUNTERS(ctypes.Structure):
+        _fields_ = [(name, ctypes.c_ulonglong) for name in (
+            'ReadOperationCount', 'WriteOperationCount', 'OtherOperationCount',
+            'ReadTransferCount', 'WriteTransferCount', 'OtherTransferCount'
+        )]
+
+    def windows_usage(process, usage):
+        # handle of finished process is valid until Popen object is deleted
+        handle = wintypes.HANDLE(int(process._handle))
+        times = [FILETIME() for _ in range(4)]
+        if ctypes.windll.kernel32.GetProcessTimes(handle, *[ctypes.byref(t) for t in times]):
+            usage['user'] = times[3].seconds()
+            usage['system'] = times[2].seconds()
+        memory = PROCESS_MEMORY_COUNTERS()
+        memory.cb = ctypes.sizeof(memory)
+        if ctypes.windll.psapi.GetProcessMemoryInfo(handle, ctypes.byref(memory), memory.cb):
+            usage['peak_rss'] = memory.PeakWorkingSetSize
+        io = IO_COUNTERS()
+        if ctypes.windll.kernel32.GetProcessIoCounters(handle, ctypes.byref(io)):
+            usage['read_bytes'] = io.ReadTransferCount
+            usage['write_bytes'] = io.WriteTransferCount
+
+    class MEMORYSTATUSEX(ctypes.Structure):
+        _fields_ = [('dwLength', wintypes.DWORD), ('dwMemoryLoad', wintypes.DWORD)] + [
+            (name, ctypes.c_ulonglong) for name in (
+                'ullTotalPhys', 'ullAvailPhys', 'ullTotalPageFile', 'ullAvailPageFile',
+                'ullTotalVirtual', 'ullAvailVirtual', 'ullAvailExtendedVirtual'
+            )
+        ]
+
+
+def rusage_usage(rusage, usage):
+    usage['user'] = rusage.ru_utime
+    usage['system'] = rusage.ru_stime
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS, blocks of I/O are 512 bytes
+    usage['peak_rss'] = rusage.ru_maxrss * (1 if sys.platform == 'darwin' else 1024)
+    usage['read_bytes'] = rusage.ru_inblock * 512
+    usage['write_bytes'] = rusage.ru_oublock * 512
+
+
+def available_memory():
+    # bytes of physical memory available for new processes, None if it is not known
+    if os.name == 'nt':
+        status = MEMORYSTATUSEX()
+        status.dwLength = ctypes.sizeof(status)
+        if ctypes.windll.kernel32.GlobalMemoryStatusEx(ctypes.byref(status)):
+            return status.ullAvailPhys
+        return None
+    try:
+        with open('/proc/meminfo') as meminfo:
+            for line in meminfo:
+                if line.startswith('MemAvailable:'):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError, IndexError):
+        pass
+    return None
+
+
+def available_cpus():
+    if hasattr(os, 'sched_getaffinity'):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+
+def start_process(args, cwd=None, env=None, cpus=None):
+    # on Linux program is started by taskset, so it is bound to cpus before it is executed and all its threads
+    # inherit the affinity (preexec_fn is not safe when runs are started by several threads); without taskset and
+    # on Windows affinity is set just after start
+    if cpus is not None and hasattr(os, 'sched_setaffinity') and taskset is not None:
+        command = [args] if isinstance(args, str) else list(args)
+        return subprocess.Popen(
+            [taskset, '-c', ','.join(str(cpu) for cpu in sorted(cpus))] + command, cwd=cwd, env=env
+        )
+    process = subprocess.Popen(args, cwd=cwd, env=env)
+    if cpus is not None and hasattr(os, 'sched_setaffinity'):
+        try:
+            os.sched_setaffinity(process.pid, cpus)
+        except OSError:
+            # program is already finished
+            pass
+    elif cpus is not None and os.name == 'nt':
+        ctypes.windll.kernel32.SetProcessAffinityMask(
+            wintypes.HANDLE(int(process._handle)), ctypes.c_size_t(sum(1 << cpu for cpu in cpus))
+        )
+    return process
+
+
+def wait_process(process, timeout=None, usage=None):
+    # the same as process.wait(timeout), resources used by process are added into usage
+    if usage is None or not hasattr(os, 'wait4') or process.returncode is not None:
+        code = process.wait(timeout)
+        if usage is not None and os.name == 'nt':
+            windows_usage(process, usage)
+        return code
+
+    # child is collected by wait4 to get its own resource usage, also when several programs run at once
+    deadline = None if timeout is None else time.time() + timeout
+    while True:
+        pid, status, rusage = os.wait4(process.pid, 0 if deadline is None else os.WNOHANG)
+        if pid != 0:
+            break
+        if time.time() >= deadline:
+            raise subprocess.TimeoutExpired(process.args, timeout)
+        time.sleep(min(0.05, timeout))
+
+    process.returncode = os.waitstatus_to_exitcode(status)
+    rusage_usage(rusage, usage)
+    return process.returncode
+
+
+class Metrics:
+    columns = (
+        'run', 'point', 'status', 'wall', 'user', 'system', 'peak_rss',
+        'read_bytes', 'write_bytes', 'output_bytes', 'settings', 'harvest', 'stop'
+    )
+
+    def __init__(self, filename=None):
+        self.filename = filename
+        self.lock = threading.Lock()
+        self.rows = []
+        self.start = time.time()
+        self.metrics_file = None
+
+        if self.filename is not None:
+            self.metrics_file = open(self.filename, 'a')
+            if self.metrics_file.tell() == 0:
+                self.metrics_file.write('\t'.join(self.columns) + '\n')
+
+    def __del__(self):
+        self.close()
+
+    def record(self, **row):
+        with self.lock:
+            row['run'] = row.get('run', len(self.rows) + 1)
+            self.rows.append(row)
+            if self.metrics_file is not None:
+                self.metrics_file.write('\t'.join(self.field(row.get(c, '')) for c in self.columns) + '\n')
+                self.metrics_file.flush()
+
+    @staticmethod
+    def field(value):
+        return '{:.6f}'.format(value) if type(value) is float else str(value)
+
+    def summary(self):
+        with self.lock:
+            rows = list(self.rows)
+        elapsed = time.time() - self.start
+        solver = sum(row.get('wall', 0) for row in rows)
+        driver = sum(row.get('settings', 0) + row.get('harvest', 0) for row in rows)
+        return {
+            'runs': len(rows),
+            'failed': sum(1 for row in rows if row.get('status') == 'failed'),
+            'cached': sum(1 for row in rows if row.get('status') == 'cached'),
+            'stopped': sum(1 for row in rows if row.get('stop')),
+            'elapsed': elapsed,
+            'runs_per_hour': len(rows) * 3600.0 / elapsed if elapsed > 0 else 0.0,
+            'solver': solver,
+            'driver': driver,
+            'solver_share': solver / (solver + driver) if solver + driver > 0 else 0.0,
+            'cpu': sum(row.get('user', 0) + row.get('system', 0) for row in rows),
+            'peak_rss': max([row.get('peak_rss', 0) for row in rows] or [0]),
+            'output_bytes': sum(row.get('output_bytes', 0) for row in rows),
+        }
+
+    def report(self, log=print):
+        s = self.summary()
+        log('Runs: {runs} ({failed} failed, {cached} from cache, {stopped} stopped early), {runs_per_hour:.1f} runs '
+            'per hour.'.format(**s))
+        log('Time of program: {solver:.1f} s, time of driver: {driver:.1f} s, program share {solver_share:.1%}.'.format(
+            **s
+        ))
+        log('CPU time of program: {cpu:.1f} s, peak RSS: {peak_rss} bytes, output files: {output_bytes} bytes.'.format(
+            **s
+        ))
+
+    def close(self):
+        with self.lock:
+            if self.metrics_file is not None:
+                self.metrics_file.close()
+                self.metrics_file = None
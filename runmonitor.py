@@ -0,0 +1,207 @@
+# -*- coding: UTF-8 -*-
+
+import os
+import re
+import copy
+import math
+import time
+import threading
+from collections import deque
+
+from resultreader import parse_row
+
+
+# Non-finite values as they are printed by C and C++ runtimes: nan, -nan(ind), inf, 1.#INF, 1.#QNAN
+non_finite_re = re.compile(
+    rb'(?<![A-Za-z])[-+]?(nan(\(\w*\))?|inf(inity)?|\d\.#(inf|qnan|snan|ind)\w*)(?![A-Za-z])', re.I
+)
+
+
+class Tail:
+
+    def __init__(self, filename, start):
+        # file written before start of run is the result of previous run, it is not read
+        self.filename = filename
+        self.start = start
+        self.offset = 0
+        self.rest = b''
+
+    def lines(self):
+        # complete lines added to file since the last call
+        try:
+            stat = os.stat(self.filename)
+        except OSError:
+            return []
+        if stat.st_mtime < self.start - 1:
+            return []
+        if stat.st_size < self.offset:
+            # file is written again from the beginning
+            self.offset = 0
+            self.rest = b''
+        if stat.st_size == self.offset:
+            return []
+
+        with open(self.filename, 'rb') as tail_file:
+            tail_file.seek(self.offset)
+            data = self.rest + tail_file.read(stat.st_size - self.offset)
+        self.offset = stat.st_size
+        end = data.rfind(b'\n') + 1
+        self.rest = data[end:]
+        return data[:end].splitlines()
+
+
+class Criterion:
+    # criterion reads new lines of one output file and returns the reason to stop the run or None
+
+    def __init__(self, filename):
+        self.filename = filename
+
+    def update(self, lines):
+        return None
+
+
+class NonFinite(Criterion):
+
+    def update(self, lines):
+        for line in lines:
+            if non_finite_re.search(line):
+                return 'non-finite value in {}'.format(self.filename)
+        return None
+
+
+class Limit(Criterion):
+
+    def __init__(self, filename, limit, column=None):
+        # the run is diverged when absolute value of column (of any column if it is None) exceeds limit
+        Criterion.__init__(self, filename)
+        self.limit = limit
+        self.column = column
+
+    def update(self, lines):
+        for line in lines:
+            row = parse_row(line)
+            if row is None:
+                continue
+            values = row if self.column is None else row[self.column:self.column + 1 or None]
+            for value in values:
+                if abs(value) > self.limit:
+                    return 'value {} exceeds {} in {}'.format(value, self.limit, self.filename)
+        return None
+
+
+class SteadyState(Criterion):
+
+    def __init__(self, filename, column=-1, window=100, tolerance=1e-3, min_rows=None):
+        # mean absolute value of column over the last window differs from the previous window less than tolerance,
+        # so oscillating signals are steady when their amplitude is settled
+        Criterion.__init__(self, filename)
+        self.column = column
+        self.window = window
+        self.tolerance = tolerance
+        self.min_rows = min_rows if min_rows is not None else 2 * window
+        self.rows = 0
+        self.values = deque(maxlen=2 * window)
+
+    def update(self, lines):
+        for line in lines:
+            row = parse_row(line)
+            if row is None or not -len(row) <= self.column < len(row):
+                continue
+            self.values.append(abs(row[self.column]))
+            self.rows += 1
+        if self.rows < self.min_rows or len(self.values) < 2 * self.window:
+            return None
+
+        values = list(self.values)
+        previous = sum(values[:self.window]) / self.window
+        last = sum(values[self.window:]) / self.window
+        if not math.isfinite(last):
+            return None
+        if abs(last - previous) <= self.tolerance * max(abs(previous), 1e-300):
+            return 'steady state of {} after {} rows'.format(self.filename, self.rows)
+        return None
+
+
+class Pattern(Criterion):
+
+    def __init__(self, filename, pattern, reason=None):
+        # e.g. Pattern('log.txt', r'Courant condition')
+        Criterion.__init__(self, filename)
+        self.pattern = re.compile(pattern.encode() if isinstance(pattern, str) else pattern)
+        self.reason = reason
+
+    def update(self, lines):
+        for line in lines:
+            if self.pattern.search(line):
+                return self.reason or '{} in {}'.format(line.decode(errors='replace').strip(), self.filename)
+        return None
+
+
+class Watch:
+
+    def __init__(self, criteria, directory, start):
+        # every run has its own copies of criteria, several runs could be watched at once
+        self.criteria = [copy.deepcopy(c) for c in criteria]
+        self.tails = {}
+        for c in self.criteria:
+            if c.filename not in self.tails:
+                self.tails[c.filename] = Tail(os.path.join(directory, c.filename), start)
+
+    def check(self):
+        lines = dict((filename, tail.lines()) for filename, tail in self.tails.items())
+        for c in self.criteria:
+            if lines[c.filename]:
+                reason = c.update(lines[c.filename])
+                if reason is not None:
+                    return reason
+        return None
+
+
+class Monitor:
+
+    def __init__(self, *criteria, **kwargs):
+        # grace is time given to program to finish after it is asked to stop, run_time is the usual time of complete
+        # run, it is used to estimate time saved by early stopping when there are no complete runs
+        self.criteria = criteria
+        self.grace = kwargs.get('grace', 10.0)
+        self.run_time = kwargs.get('run_time')
+        self.lock = threading.Lock()
+        self.stopped = {}
+        self.stopped_wall = 0.0
+        self.complete = 0
+        self.complete_wall = 0.0
+
+    def watch(self, directory):
+        return Watch(self.criteria, directory, time.time())
+
+    def record(self, reason, wall):
+        with self.lock:
+            if reason is None:
+                self.complete += 1
+                self.complete_wall += wall
+            else:
+                # reasons are counted by kind, without numbers of rows and values
+                kind = re.sub(r'[-+]?\d[\w\.\+\-]*', '#', reason)
+                self.stopped[kind] = self.stopped.get(kind, 0) + 1
+                self.stopped_wall += wall
+
+    def summary(self):
+        with self.lock:
+            stopped = sum(self.stopped.values())
+            # time saved is estimated by mean time of complete runs
+            mean = self.complete_wall / self.complete if self.complete else self.run_time
+            return {
+                'runs': stopped + self.complete,
+                'stopped': stopped,
+                'reasons': dict(self.stopped),
+                'stopped_wall': self.stopped_wall,
+                'saved': max(mean * stopped - self.stopped_wall, 0.0) if mean is not None else None,
+            }
+
+    def report(self, log=print):
+        s = self.summary()
+        log('Runs stopped early: {stopped} of {runs}, time of stopped runs: {stopped_wall:.1f} s.'.format(**s))
+        for kind, n in sorted(s['reasons'].items()):
+            log('  {}: {}.'.format(kind, n))
+        if s['saved'] is not None and s['stopped']:
+            log('Time saved by early stopping: {:.1f} s.'.format(s['saved']))
@@ -0,0 +1,160 @@
+# -*- coding: UTF-8 -*-
+
+# Progress of running test over HTTP:
+#
+#   http://127.0.0.1:8765/           JSON
+#   http://127.0.0.1:8765/metrics    Prometheus text format
+
+import json
+import time
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class SweepStatus:
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.test = None
+        self.planned = 0
+        self.skipped = 0
+        self.workers = 1
+        self.start = time.time()
+        self.last_progress = self.start
+        self.done = 0
+        self.failed = 0
+        self.cached = 0
+        self.stopped = 0
+        self.solver = 0.0
+        self.running = {}
+
+    def begin(self, test, planned, finished=0, workers=1):
+        # runs finished before the start of test (resumed test) are not counted in runs per hour
+        with self.lock:
+            self.test = test
+            self.planned = planned
+            self.skipped = finished
+            self.workers = workers or 1
+            self.start = time.time()
+            self.last_progress = self.start
+            self.done = 0
+            self.failed = 0
+            self.cached = 0
+            self.stopped = 0
+            self.solver = 0.0
+
+    def started(self, key, point):
+        with self.lock:
+            self.running[key] = (point, time.time())
+
+    def finished(self, key, usage):
+        with self.lock:
+            self.running.pop(key, None)
+            self.done += 1
+            self.last_progress = time.time()
+            status = usage.get('status')
+            if status == 'failed':
+                self.failed += 1
+            elif status == 'cached':
+                self.cached += 1
+            if usage.get('stop'):
+                self.stopped += 1
+            self.solver += usage.get('wall', 0.0)
+
+    def snapshot(self):
+        with self.lock:
+            now = time.time()
+            elapsed = now - self.start
+            remaining = max(self.planned - self.skipped - self.done, 0) if self.planned else None
+            eta = elapsed / self.done * remaining if self.done and remaining is not None else None
+            return {
+                'test': self.test,
+                'planned': self.planned,
+                'done': self.skipped + self.done,
+                'failed': self.failed,
+                'cached': self.cached,
+                'stopped': self.stopped,
+                'remaining': remaining,
+                'running': [
+                    {'point': point, 'seconds': now - start}
+                    for point, start in sorted(self.running.values(), key=lambda r: r[1])
+                ],
+                'elapsed': elapsed,
+                'runs_per_hour': self.done * 3600.0 / elapsed if elapsed > 0 else 0.0,
+                'eta': eta,
+                # solver share of wall time of all workers
+                'solver_share': self.solver / (elapsed * self.workers) if elapsed > 0 else 0.0,
+                'seconds_since_progress': now - self.last_progress,
+            }
+
+    def prometheus(self):
+        s = self.snapshot()
+        lines = []
+        gauges = (
+            ('points_planned', 'planned', 'Points of test.'),
+            ('points_done', 'done', 'Points finished, with failed ones.'),
+            ('points_failed', 'failed', 'Points failed.'),
+            ('points_cached', 'cached', 'Points restored from cache.'),
+            ('points_stopped', 'stopped', 'Points stopped early by monitor.'),
+            ('points_remaining', 'remaining', 'Points which are not finished.'),
+            ('runs_per_hour', 'runs_per_hour', 'Runs per hour since the start of test.'),
+            ('eta_seconds', 'eta', 'Estimated time till the end of test.'),
+            ('solver_share', 'solver_share', 'Share of wall time of workers spent by program.'),
+            ('elapsed_seconds', 'elapsed', 'Time since the start of test.'),
+            ('seconds_since_progress', 'seconds_since_progress', 'Time since the last finished run.'),
+        )
+        for name, field, description in gauges:
+            if s[field] is None:
+                continue
+            lines.append('# HELP testlib2_{} {}'.format(name, description))
+            lines.append('# TYPE testlib2_{} gauge'.format(name))
+            lines.append('testlib2_{} {}'.format(name, s[field]))
+
+        lines.append('# HELP testlib2_run_seconds Time of runs which are executed now.')
+        lines.append('# TYPE testlib2_run_seconds gauge')
+        for run in s['running']:
+            point = str(run['point']).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+            lines.append('testlib2_run_seconds{{point="{}"}} {}'.format(point, run['seconds']))
+        return '\n'.join(lines) + '\n'
+
+
+class StatusHandler(BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        status = self.server.status
+        if self.path.split('?')[0] == '/metrics':
+            body = status.prometheus().encode()
+            content_type = 'text/plain; version=0.0.4; charset=utf-8'
+        elif self.path.split('?')[0] in ('/', '/status'):
+            body = json.dumps(status.snapshot(), indent=1).encode()
+            content_type = 'application/json'
+        else:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # requests are not written into console of test
+        pass
+
+
+class StatusServer:
+
+    def __init__(self, status, port=8765, host='127.0.0.1'):
+        # server is only reachable from this computer unless host is given
+        self.server = ThreadingHTTPServer((host, port), StatusHandler)
+        self.server.daemon_threads = True
+        self.server.status = status
+        self.port = self.server.server_address[1]
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+
+    def close(self):
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
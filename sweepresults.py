@@ -0,0 +1,255 @@
+# -*- coding: UTF-8 -*-
+
+# Lazy access to results of finished test:
+#
+#   res = SweepResults('D:\\Avt63\\Results\\<test>', FlucJcen, FlucIcen)
+#   res.sel(FlucJcen=1150, FlucIcen=slice(200, 250)).map(max, 'det_SD.txt')
+#
+# Files are read only when they are accessed, decoded arrays are kept in cache of bounded size.
+
+import os
+import threading
+from array import array
+from collections import OrderedDict
+
+from resultreader import rows as text_rows
+from resultarchive import version, listdir
+from runindex import scan_directory, read_journal, directory_points, settings_filename, number
+
+
+# Size of cache of decoded arrays shared by all SweepResults, bytes
+cache_size = 256 * 1024 ** 2
+
+
+def coordinate(value):
+    # values of directories and of parameters are compared as numbers when it is possible
+    x = number(value)
+    if x is None:
+        return value
+    return float('{:.12g}'.format(x))
+
+
+def decode(filename, mapped=True):
+    # rows of text file as flat array of doubles, ragged rows are kept as a flat sequence of values (cols is 0)
+    values = array('d')
+    n = 0
+    cols = None
+    for row in text_rows(filename, mapped=mapped):
+        if cols is None:
+            cols = len(row)
+        elif cols != len(row):
+            cols = 0
+        values.extend(row)
+        n += 1
+    return values, n, cols or 0
+
+
+class ArrayCache:
+
+    def __init__(self, size_limit=cache_size):
+        self.size_limit = size_limit
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.arrays = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, filename, mapped=True):
+        # changed file is decoded again, the least recently used arrays are dropped when cache is full
+        key = (filename,) + tuple(version(filename))
+        with self.lock:
+            if key in self.arrays:
+                self.arrays.move_to_end(key)
+                self.hits += 1
+                return self.arrays[key]
+            self.misses += 1
+
+        decoded = decode(filename, mapped)
+        size = len(decoded[0]) * decoded[0].itemsize
+        with self.lock:
+            if key not in self.arrays:
+                self.arrays[key] = decoded
+                self.size += size
+            while self.size > self.size_limit and len(self.arrays) > 1:
+                _, (values, _, _) = self.arrays.popitem(last=False)
+                self.size -= len(values) * values.itemsize
+        return decoded
+
+    def clear(self):
+        with self.lock:
+            self.arrays.clear()
+            self.size = 0
+
+
+shared_cache = ArrayCache()
+
+
+class SweepResults:
+
+    def __init__(self, res_dir, *parameters, **kwargs):
+        # parameters give names and values of axes, without them axes are found from journal, name=value
+        # directories and settings files of runs
+        self.res_dir = res_dir
+        self.cache = kwargs.get('cache', shared_cache)
+        self.mapped = kwargs.get('mapped', True)
+        log = kwargs.get('log', print)
+
+        self.names = tuple(p.name() for p in parameters)
+        self.axes = OrderedDict(
+            (p.name(), [coordinate(v) for v in (p.values() if hasattr(p, 'values') else p)]) for p in parameters
+        )
+        self.fixed = ()
+        self.runs = {}
+
+        journal = read_journal(res_dir)
+        for directory, _, _ in os.walk(res_dir):
+            results = scan_directory(directory)
+            if not results:
+                continue
+            points, _ = directory_points(res_dir, directory, results, journal, log)
+            for i, point in points.items():
+                point = dict((name, coordinate(value)) for name, value in point)
+                if self.names:
+                    # the last parameter is changed inside directory, its value is given by index of run
+                    last = self.names[-1]
+                    if last not in point and 0 < i <= len(self.axes[last]):
+                        point[last] = self.axes[last][i - 1]
+                    if any(name not in point for name in self.names):
+                        log('[ERROR] Cannot find point of run {} in directory ({}).'.format(i, directory))
+                        continue
+                else:
+                    # names of axes are taken from the first run
+                    self.names = tuple(name for name, _ in points[i])
+                key = tuple(point.get(name) for name in self.names)
+                self.runs[key] = (directory, i)
+
+        if not parameters:
+            for k, name in enumerate(self.names):
+                values = set(key[k] for key in self.runs if key[k] is not None)
+                self.axes[name] = sorted(values, key=lambda v: (type(v) is not float, v))
+
+    @classmethod
+    def view(cls, parent, names, axes, fixed, runs):
+        res = cls.__new__(cls)
+        res.res_dir = parent.res_dir
+        res.cache = parent.cache
+        res.mapped = parent.mapped
+        res.names = names
+        res.axes = axes
+        res.fixed = fixed
+        res.runs = runs
+        return res
+
+    def __len__(self):
+        return len(self.runs)
+
+    def __iter__(self):
+        # named points of runs in order of axes
+        for key in sorted(self.runs, key=self.order):
+            yield self.fixed + tuple(zip(self.names, key))
+
+    def __str__(self):
+        return 'SweepResults({}, {}, runs={})'.format(
+            self.res_dir, ', '.join('{}: {}'.format(name, len(values)) for name, values in self.axes.items()),
+            len(self)
+        )
+
+    def __getitem__(self, name):
+        return self.get(name)
+
+    def order(self, key):
+        return tuple(
+            self.axes[name].index(value) if value in self.axes[name] else len(self.axes[name])
+            for name, value in zip(self.names, key)
+        )
+
+    def shape(self):
+        return tuple(len(self.axes[name]) for name in self.names)
+
+    def sel(self, **selection):
+        # xarray-like selection by values: value drops the axis, slice(begin, end) and list of values keep it
+        names = list(self.names)
+        axes = OrderedDict(self.axes)
+        fixed = list(self.fixed)
+        runs = self.runs
+
+        for name, selector in selection.items():
+            if name not in axes:
+                raise KeyError('SweepResults.sel(): axis {} is not found'.format(name))
+            k = names.index(name)
+            values = axes[name]
+            if isinstance(selector, slice):
+                # bounds are included, for descending axes slice(200, 250) selects the same values
+                begin = coordinate(selector.start) if selector.start is not None else None
+                end = coordinate(selector.stop) if selector.stop is not None else None
+                if begin is not None and end is not None and begin > end:
+                    begin, end = end, begin
+                kept = [v for v in values if (begin is None or v >= begin) and (end is None or v <= end)]
+            elif isinstance(selector, (list, tuple)):
+                kept = [coordinate(v) for v in selector]
+            else:
+                kept = [coordinate(selector)]
+            missing = [v for v in kept if v not in values]
+            if missing:
+                raise KeyError('SweepResults.sel(): values {} are not found on axis {}'.format(missing, name))
+
+            kept_set = set(kept)
+            runs = dict((key, run) for key, run in runs.items() if key[k] in kept_set)
+            if isinstance(selector, (slice, list, tuple)):
+                axes[name] = kept
+            else:
+                del axes[name]
+                del names[k]
+                fixed.append((name, kept[0]))
+                runs = dict((key[:k] + key[k + 1:], run) for key, run in runs.items())
+
+        return self.view(self, tuple(names), axes, tuple(fixed), runs)
+
+    def run(self, point=None):
+        # directory and index of run, the only run of view if point is not given
+        if point is None:
+            if len(self.runs) != 1:
+                raise ValueError('SweepResults(): {} runs are selected, one is expected'.format(len(self.runs)))
+            return next(iter(self.runs.values()))
+        named = dict(point)
+        key = tuple(coordinate(named.get(name)) for name in self.names)
+        if key not in self.runs:
+            raise KeyError('SweepResults(): results of point {} are not found'.format(point))
+        return self.runs[key]
+
+    def path(self, name, point=None):
+        directory, i = self.run(point)
+        return os.path.join(directory, '{}_{}'.format(i, name))
+
+    def files(self, point=None):
+        # names of result files, of the first run if several runs are selected
+        if point is None and len(self.runs) > 1:
+            directory, i = self.runs[min(self.runs, key=self.order)]
+        else:
+            directory, i = self.run(point)
+        prefix = '{}_'.format(i)
+        return sorted(
+            filename[len(prefix):] for filename in listdir(directory)
+            if filename.startswith(prefix) and filename[len(prefix):] != settings_filename
+        )
+
+    def get(self, name, point=None):
+        # values of result file as flat array of doubles, rows of it are given by array_shape()
+        values, _, _ = self.cache.get(self.path(name, point), self.mapped)
+        return values
+
+    def array_shape(self, name, point=None):
+        _, n, cols = self.cache.get(self.path(name, point), self.mapped)
+        return n, cols
+
+    def arrays(self, name):
+        # (named point, values) of every run of view, files are read one by one
+        for point in self:
+            yield point, self.get(name, point[len(self.fixed):])
+
+    def map(self, function, name):
+        # function of values of result file for every run of view: {point of axes: value}
+        return OrderedDict(
+            (tuple(value for _, value in point[len(self.fixed):]), function(values))
+            for point, values in self.arrays(name)
+        )
@@ -2,13 +2,69 @@
 
 import os
 import re
+import sys
+import math
 import time
+import copy
+import json
+import errno
+import heapq
+import atexit
+import hashlib
+import itertools
 import shutil
+import socket
+import threading
 import subprocess
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed
+
+from resultstore import ResultStore, store_filename
+from runmetrics import Metrics, metrics_filename, wait_process, start_process, available_memory, available_cpus
+from runindex import RunIndex, index_filename, file_hash
+from runmonitor import Monitor, NonFinite, Limit, SteadyState, Pattern
+from runstatus import SweepStatus, StatusServer
+from resultarchive import ResultArchive, pack_results, unpack_results
 
 
 # Name of file with settings
 settings_filename = 'Settings.ini'
+# Name of file with finished points of test, it is kept in directory for results
+journal_filename = 'journal.txt'
+# Name of file with points and values of metric of adaptive test
+adaptive_filename = 'adaptive.txt'
+# Name of file with all evaluations of objective made by optimize_parameters
+optimize_filename = 'optimize.txt'
+# Name of file with scores and fidelity of every run of screening test
+screening_filename = 'screening.txt'
+# Name of file with all runs planned by sweep_parameters_test
+plan_filename = 'plan.txt'
+# Name of file with values of reducers for every point of test
+maps_filename = 'maps.txt'
+# Lock files of sharded test are kept in this subdirectory of directory for results, results of shards in the other
+claims_dirname = 'claims'
+shards_dirname = 'shards'
+
+# Messages of Log are written by background thread every log_flush_interval seconds
+log_buffered = False
+log_flush_interval = 1.0
+# Messages of Log are written as JSON lines with fields of run (number of run, point)
+log_structured = False
+
+# Snapshots of settings written by driver for one run (isolated runs, staging of archiver) are saved into directory
+# for results by hardlink when it is possible, they are never changed later; the live settings file is copied or
+# reflinked, since it could be changed in place
+harvest_links = True
+# Files copied between volumes are checked by 'size' or by 'checksum' of contents
+harvest_verify = 'checksum'
+
+# Every run of tests is recorded in index.sqlite in the parent directory of directory for results
+index_results = True
+
+# Progress of test is served on http://127.0.0.1:8765/ (JSON) and /metrics (Prometheus) with status=True
+status_port = 8765
+
+# Environment variables which limit threads of program, they are set by Resources(threads=...)
+thread_variables = ('OMP_NUM_THREADS', 'MKL_NUM_THREADS', 'OPENBLAS_NUM_THREADS')
 
 # Paths to components
 path_to_solution = 'D:\\Avt63\\FDTD_2D_FULL\\'
@@ -18,6 +74,12 @@ path_to_builded = path_to_project
 path_to_program = path_to_project + 'FDTD_2D_Full.exe'
 #path_to_result_dir = u'\\\\?\\{}ResultDir\\'.format(path_to_solution)
 path_to_result_dir = 'D:\\Avt63\\Results\\' 
+# Every parallel run gets its own subdirectory here with a copy of settings file
+path_to_scratch_dir = path_to_solution + 'Scratch\\'
+# Results of already executed settings are kept here by ResultCache
+path_to_cache_dir = path_to_solution + 'Cache\\'
+# Results are moved here right after execution and are archived into directory for results by Archiver
+path_to_archive_dir = path_to_solution + 'Archive\\'
 
 # Files will be saved into the directory for results after program executed
 files_for_save = list([
@@ -58,17 +120,48 @@ files_for_delete = list([
     'RcData.txt',
 ])
 
+# Files added into consolidated store of test (store=True); field dumps are large, they are parsed only when they are
+# listed here or in store_files of test
+store_files = [filename for filename in files_for_save if filename not in ('FieldSaveDat.txt', 'Ez.txt')]
+
 
 def sign(a):
     return (a >= 0) - (a < 0)
 
 
+def axis_length(begin, end, step):
+    # small tolerance keeps the end of axis when (end - begin) / step is a bit less than integer
+    return int(math.floor((end - begin) / step + 1e-9)) + 1
+
+
+def clean_value(value):
+    # rounding errors of float arithmetic are removed, so values and names of directories are stable
+    if type(value) is float:
+        return float('{:.15g}'.format(value))
+    return value
+
+
+def axis_value(begin, end, step, n, k):
+    # every value is computed from its index, so errors are not accumulated along the axis
+    value = begin + k * step if k > 0 else begin
+    if k == n - 1 and sign(step) * (value + step) > sign(step) * end:
+        return end
+    return clean_value(value)
+
+
 class Log:
 
-    def __init__(self, log_filename='log.txt', mode='a'):
+    def __init__(self, log_filename='log.txt', mode='a', buffered=None, structured=None, flush_interval=None):
         self.log_filename = log_filename
         self.log_filename_mode = mode
         self.error = False
+        self.lock = threading.Lock()
+        self.buffered = log_buffered if buffered is None else buffered
+        self.structured = log_structured if structured is None else structured
+        self.flush_interval = log_flush_interval if flush_interval is None else flush_interval
+        self.records = []
+        self.records_lock = threading.Lock()
+        self.writer = None
 
         try:
             self.log_file = open(self.log_filename, self.log_filename_mode)
@@ -76,32 +169,89 @@ class Log:
             self.log_file = ''
             self.error = True
 
+        # messages are collected by q() and written in batches by writer thread
+        if self.buffered:
+            self.wakeup = threading.Event()
+            self.writer = threading.Thread(target=self.write_records, daemon=True)
+            self.writer.start()
+            open_logs.add(self)
+
     def __del__(self):
         self.close()
 
     def q(self, message):
+        record = (time.time(), message, getattr(log_context, 'fields', {}))
+        if self.writer is not None:
+            with self.records_lock:
+                self.records.append(record)
+        else:
+            self.write([record])
+
+    def format(self, record):
+        t, message, fields = record
         message_p = "{}: {}".format(
-            time.strftime('%Y%m%d_%H%M%S', time.localtime()),
+            time.strftime('%Y%m%d_%H%M%S', time.localtime(t)),
             message
         )
-        message = message_p + '\r\n'
+        if not self.structured:
+            return message_p, message_p + '\r\n'
+
+        entry = {
+            'time': time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(t)) + '.{:03d}'.format(int(t % 1 * 1000)),
+            'level': 'error' if '[ERROR]' in message else 'info',
+            'message': message,
+        }
+        entry.update(fields)
+        return message_p, json.dumps(entry, default=str) + '\n'
 
-        print(message_p)
+    def write(self, records):
+        lines = [self.format(record) for record in records]
 
-        if not self.error:
-            self.log_file.write(message)
-            self.log_file.flush()
+        print('\n'.join(message_p for message_p, _ in lines))
+
+        with self.lock:
+            if not self.error:
+                self.log_file.write(''.join(line for _, line in lines))
+                self.log_file.flush()
+
+    def write_records(self):
+        while True:
+            stopped = self.wakeup.wait(self.flush_interval)
+            with self.records_lock:
+                records = self.records
+                self.records = []
+            if records:
+                self.write(records)
+            if stopped:
+                return
 
     def close(self):
-        if not self.error:
-            self.error = True
-            self.log_file.write('\r\n\r\n\r\n')
-            self.log_file.close()
+        if self.writer is not None:
+            self.wakeup.set()
+            if self.writer is not threading.current_thread():
+                self.writer.join()
+            self.writer = None
+            open_logs.discard(self)
+
+        with self.lock:
+            if not self.error:
+                self.error = True
+                if not self.structured:
+                    self.log_file.write('\r\n\r\n\r\n')
+                self.log_file.close()
 
     def sep(self):
         self.q('-----------------------')
 
 
+# Buffered logs are written when program exits, even if they are not closed
+open_logs = set()
+atexit.register(lambda: [log.close() for log in list(open_logs)])
+
+# Fields of structured log set by the thread which executes a run, e.g. {'run': 3, 'point': {'FlucIcen': 200}}
+log_context = threading.local()
+
+
 class Parameter:
     __parameter = None
     __begin = None
@@ -129,7 +279,7 @@ class Parameter:
                 raise ValueError('Parameter(): step < 0 when begin < end, check values')
             if begin > end and step > 0:
                 raise ValueError('Parameter(): step > 0 when begin > end, check values')
-            self.__n = int((end - begin) / step) + 1
+            self.__n = axis_length(begin, end, step)
         self.__step = step
 
         if self.__step is None and self.__n is None:
@@ -160,12 +310,8 @@ class Parameter:
         return self.next()
 
     def next(self):
-        sg = sign(self.__step)
         if self.__i < self.__n:
-            if sg*(self.__value + self.__step) > sg*self.__end:
-                current = self.__end
-            else:
-                current = self.__value
+            current = axis_value(self.__begin, self.__end, self.__step, self.__n, self.__i)
 
             self.__value += self.__step
             self.__i += 1
@@ -178,24 +324,7 @@ class Parameter:
         return self.__value
 
     def values(self):
-        res = []
-        i = 0
-        v = self.__begin
-        sg = sign(self.__step)
-
-        while True:
-            if i < self.__n:
-                if sg*(v + self.__step) > sg*self.__end:
-                    current = self.__end
-                else:
-                    current = v
-
-                v += self.__step
-                i += 1
-                res.append(current)
-            else:
-                break
-        return res
+        return list(Axis.from_parameter(self))
 
     def name(self):
         return self.__parameter
@@ -213,157 +342,1500 @@ class Parameter:
     def step(self):
         return self.__step
 
+    def n(self):
+        return self.__n
+
+
+class Axis:
+
+    def __init__(self, name, values=None, kind='list', begin=None, end=None, n=None, step=None):
+        if type(name) is not str:
+            raise TypeError('Axis(): name, only str accepted')
+
+        self.__name = name
+        self.__kind = kind
+        self.__begin = begin
+        self.__end = end
+        self.__step = step
+
+        if kind == 'list':
+            if values is None or len(values) == 0:
+                raise ValueError('Axis(): values of axis are empty')
+            self.__values = tuple(values)
+            self.__n = len(self.__values)
+        else:
+            self.__values = None
+            self.__n = n
+
+    @classmethod
+    def linspace(cls, name, begin, end, n):
+        if type(n) is not int or n < 1:
+            raise TypeError('Axis.linspace(): n, only positive integers are accepted')
+        step = (end - begin) / ((n - 1) if n > 1 else 1)
+        return cls(name, kind='step', begin=begin, end=end, n=n, step=step)
+
+    @classmethod
+    def arange(cls, name, begin, end, step):
+        if step == 0 or sign(step) != sign(end - begin) and begin != end:
+            raise ValueError('Axis.arange(): step does not lead from begin to end, check values')
+        return cls(name, kind='step', begin=begin, end=end, n=axis_length(begin, end, step), step=step)
+
+    @classmethod
+    def logspace(cls, name, begin, end, n):
+        # begin and end are values of axis (not exponents), points are distributed geometrically
+        if type(n) is not int or n < 1:
+            raise TypeError('Axis.logspace(): n, only positive integers are accepted')
+        if begin == 0 or end == 0 or sign(begin) != sign(end):
+            raise ValueError('Axis.logspace(): begin and end must be nonzero and of the same sign')
+        return cls(name, kind='log', begin=begin, end=end, n=n)
+
+    @classmethod
+    def from_parameter(cls, parameter):
+        return cls(
+            parameter.name(), kind='step',
+            begin=parameter.begin(), end=parameter.end(), n=parameter.n(), step=parameter.step()
+        )
+
+    def __str__(self):
+        return "Axis(name='{}', kind={}, n={})".format(self.__name, self.__kind, self.__n)
+
+    def __len__(self):
+        return self.__n
+
+    def __iter__(self):
+        for k in range(self.__n):
+            yield self.value(k)
+
+    def __getitem__(self, k):
+        if isinstance(k, slice):
+            return [self.value(j) for j in range(*k.indices(self.__n))]
+        if k < 0:
+            k += self.__n
+        if not 0 <= k < self.__n:
+            raise IndexError('Axis(): index {} is out of range'.format(k))
+        return self.value(k)
+
+    def name(self):
+        return self.__name
+
+    def value(self, k):
+        if self.__kind == 'list':
+            return self.__values[k]
+        if self.__kind == 'log':
+            if k == self.__n - 1:
+                return self.__end
+            return clean_value(self.__begin * (self.__end / self.__begin) ** (k / (self.__n - 1)))
+        return axis_value(self.__begin, self.__end, self.__step, self.__n, k)
+
+    def index(self, value):
+        for k in range(self.__n):
+            if self.value(k) == value:
+                return k
+        raise ValueError('Axis(): value {} is not found on axis {}'.format(value, self.__name))
+
+
+class Grid:
+
+    def __init__(self, *axes, **kwargs):
+        self.__axes = tuple(Axis.from_parameter(a) if isinstance(a, Parameter) else a for a in axes)
+        for a in self.__axes:
+            if not isinstance(a, Axis):
+                raise TypeError('Grid(): only Axis and Parameter are accepted')
+
+        self.__shape = tuple(len(a) for a in self.__axes)
+        self.__size = 1
+        for length in self.__shape:
+            self.__size *= length
+
+        # view of grid keeps flat indices of the whole grid
+        self.__indices = kwargs.get('indices', range(self.__size))
+
+    def __len__(self):
+        return len(self.__indices)
+
+    def __iter__(self):
+        for flat in self.__indices:
+            yield self.point(flat)
+
+    def __getitem__(self, k):
+        if isinstance(k, slice):
+            return Grid(*self.__axes, indices=self.__indices[k])
+        return self.point(self.__indices[k])
+
+    def __str__(self):
+        return 'Grid({}, points={})'.format(', '.join(str(a) for a in self.__axes), len(self))
+
+    def axes(self):
+        return self.__axes
+
+    def names(self):
+        return tuple(a.name() for a in self.__axes)
+
+    def shape(self):
+        return self.__shape
+
+    def size(self):
+        return self.__size
+
+    def indices(self):
+        return self.__indices
+
+    def items(self):
+        for flat in self.__indices:
+            yield flat, self.point(flat)
+
+    def coordinates(self, flat):
+        # the last axis is changed first, as in n_parameters_test
+        if not 0 <= flat < self.__size:
+            raise IndexError('Grid(): flat index {} is out of range'.format(flat))
+        res = []
+        for length in reversed(self.__shape):
+            flat, k = divmod(flat, length)
+            res.append(k)
+        return tuple(reversed(res))
+
+    def flat_index(self, coordinates):
+        flat = 0
+        for k, length in zip(coordinates, self.__shape):
+            if not 0 <= k < length:
+                raise IndexError('Grid(): coordinates {} are out of range'.format(coordinates))
+            flat = flat * length + k
+        return flat
+
+    def point(self, flat):
+        return tuple(a.value(k) for a, k in zip(self.__axes, self.coordinates(flat)))
+
+    def named(self, flat):
+        return tuple(zip(self.names(), self.point(flat)))
+
+    def index_of(self, point):
+        return self.flat_index([a.index(value) for a, value in zip(self.__axes, point)])
+
+    def shard(self, k, n):
+        # k-th of n interleaved parts of grid
+        if not 0 <= k < n:
+            raise ValueError('Grid.shard(): k must be in [0, n)')
+        return Grid(*self.__axes, indices=self.__indices[k::n])
+
+
+class ResultCache:
+
+    def __init__(self, cache_dir=None, size_limit=10 * 1024 ** 3, program=None):
+        self.cache_dir = cache_dir if cache_dir is not None else path_to_cache_dir
+        self.size_limit = size_limit
+        self.program = program
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.__program_digest = None
+        self.__program_stat = None
+
+        if not os.path.isdir(self.cache_dir):
+            os.makedirs(self.cache_dir)
+
+    def program_digest(self):
+        program = self.program if self.program is not None else path_to_program
+        stat = os.stat(program)
+        stat = (program, stat.st_size, stat.st_mtime)
+
+        # the program is hashed again only when it is changed
+        if stat != self.__program_stat:
+            digest = hashlib.sha256()
+            with open(program, 'rb') as program_file:
+                for chunk in iter(lambda: program_file.read(1024 * 1024), b''):
+                    digest.update(chunk)
+            self.__program_digest = digest.hexdigest()
+            self.__program_stat = stat
+        return self.__program_digest
+
+    def key(self, settings_path):
+        digest = hashlib.sha256(self.program_digest().encode())
+        with open(settings_path, 'rb') as settings_file:
+            digest.update(settings_file.read())
+        return digest.hexdigest()
+
+    def entries(self):
+        res = []
+        for name in os.listdir(self.cache_dir):
+            path = os.path.join(self.cache_dir, name)
+            manifest = self.read_manifest(path)
+            if manifest is not None:
+                res.append((os.path.getmtime(path), name, manifest))
+        return res
+
+    @staticmethod
+    def read_manifest(path):
+        try:
+            with open(os.path.join(path, 'entry.txt')) as manifest_file:
+                return dict(line.rstrip('\n').split('=', 1) for line in manifest_file if '=' in line)
+        except (IOError, OSError):
+            return None
+
+    def restore(self, key, directory):
+        entry = os.path.join(self.cache_dir, key)
+        manifest = self.read_manifest(entry)
+        if manifest is None:
+            with self.lock:
+                self.misses += 1
+            return False
+
+        for filename in manifest['files'].split('|') if manifest['files'] else []:
+            shutil.copy(os.path.join(entry, filename), os.path.join(directory, filename))
+
+        # time of last access is used for LRU eviction
+        os.utime(entry, None)
+        with self.lock:
+            self.hits += 1
+        return True
+
+    def store(self, key, directory):
+        entry = os.path.join(self.cache_dir, key)
+        if os.path.isdir(entry):
+            return
+
+        # entry is filled in temporary directory and renamed, so incomplete entries never appear
+        temp = os.path.join(self.cache_dir, '{}.tmp{}_{}'.format(key, os.getpid(), threading.get_ident()))
+        os.makedirs(temp)
+        files = []
+        size = 0
+        for filename in files_for_save:
+            source = os.path.join(directory, filename)
+            if os.path.isfile(source):
+                shutil.copy(source, os.path.join(temp, filename))
+                files.append(filename)
+                size += os.path.getsize(source)
+
+        with open(os.path.join(temp, 'entry.txt'), 'w') as manifest_file:
+            manifest_file.write('program={}\nsize={}\nfiles={}\n'.format(
+                self.program_digest(), size, '|'.join(files)
+            ))
+
+        try:
+            os.rename(temp, entry)
+        except OSError:
+            # the same entry was stored by another run at the same time
+            shutil.rmtree(temp, ignore_errors=True)
+            return
+
+        self.evict()
+
+    def evict(self):
+        with self.lock:
+            entries = sorted(self.entries())
+            size = sum(int(manifest['size']) for _, _, manifest in entries)
+            for _, name, manifest in entries:
+                if size <= self.size_limit:
+                    break
+                shutil.rmtree(os.path.join(self.cache_dir, name), ignore_errors=True)
+                size -= int(manifest['size'])
+
+    def invalidate(self):
+        # removing entries created by other versions of the program
+        removed = 0
+        digest = self.program_digest()
+        with self.lock:
+            for _, name, manifest in self.entries():
+                if manifest['program'] != digest:
+                    shutil.rmtree(os.path.join(self.cache_dir, name), ignore_errors=True)
+                    removed += 1
+        return removed
+
+    def clear(self):
+        with self.lock:
+            for _, name, _ in self.entries():
+                shutil.rmtree(os.path.join(self.cache_dir, name), ignore_errors=True)
+
+
+class Resources:
+
+    def __init__(self, cpus_per_run=None, threads=None, memory=None, cpus=None, poll=5.0):
+        # every run is bound to its own set of cpus_per_run cpus and its thread variables are set to threads
+        # (cpus_per_run by default); memory is bytes needed by run, memory='auto' takes peak RSS of finished runs
+        self.cpus = list(cpus) if cpus is not None else available_cpus()
+        self.cpus_per_run = cpus_per_run
+        self.threads = threads if threads is not None else cpus_per_run
+        self.memory = memory
+        self.poll = poll
+        self.peak_rss = 0
+        self.active = 0
+        self.memory_waits = 0
+        self.condition = threading.Condition()
+        self.launch = threading.Lock()
+
+        self.free = []
+        if cpus_per_run:
+            if cpus_per_run > len(self.cpus):
+                raise ValueError('Resources(): cpus_per_run is more than {} cpus'.format(len(self.cpus)))
+            for k in range(0, len(self.cpus) - cpus_per_run + 1, cpus_per_run):
+                self.free.append(tuple(self.cpus[k:k + cpus_per_run]))
+        self.slots = len(self.free) or None
+
+    def environment(self):
+        if self.threads is None:
+            return None
+        env = dict(os.environ)
+        env.update((name, str(self.threads)) for name in thread_variables)
+        return env
+
+    def required_memory(self):
+        if self.memory == 'auto':
+            return self.peak_rss
+        return self.memory or 0
+
+    def acquire(self, log):
+        with self.condition:
+            while self.cpus_per_run and not self.free:
+                self.condition.wait()
+            cpus = self.free.pop(0) if self.cpus_per_run else None
+            self.active += 1
+
+        # runs are started one by one, memory is not checked if there are no other runs, otherwise the run could
+        # never start
+        with self.launch:
+            required = self.required_memory()
+            waiting = False
+            while required and self.active > 1:
+                available = available_memory()
+                if available is None or available >= required:
+                    break
+                if not waiting:
+                    log('Waiting for memory: {} bytes available, {} bytes needed.'.format(available, required))
+                    self.memory_waits += 1
+                    waiting = True
+                time.sleep(self.poll)
+        return cpus
+
+    def release(self, cpus, usage=None):
+        with self.condition:
+            if cpus is not None:
+                self.free.append(cpus)
+            self.active -= 1
+            if usage is not None:
+                self.peak_rss = max(self.peak_rss, usage.get('peak_rss', 0))
+            self.condition.notify_all()
+
+
+class Scheduler:
+
+    def __init__(self, timeout=None, stall_timeout=None, retries=0, backoff=10.0, poll=1.0, check_returncode=False,
+                 monitor=None, resources=None):
+        # timeout limits wall clock time of run, stall_timeout limits time without changes of output files,
+        # monitor stops run when its output files meet one of criteria, results of stopped run are kept,
+        # resources give cpus, threads and memory to every run
+        self.timeout = timeout
+        self.stall_timeout = stall_timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.poll = poll
+        self.check_returncode = check_returncode
+        self.monitor = monitor
+        self.resources = resources
+        self.lock = threading.Lock()
+        self.timeouts = 0
+        self.stalls = 0
+        self.repeats = 0
+        self.failures = 0
+
+    def count(self, name):
+        with self.lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    @staticmethod
+    def progress(directory):
+        # total size and last modification time of files written by program
+        size = 0
+        mtime = 0
+        for entry in os.scandir(directory):
+            if entry.is_file():
+                stat = entry.stat()
+                size += stat.st_size
+                mtime = max(mtime, stat.st_mtime)
+        return size, mtime
+
+    @staticmethod
+    def kill(process):
+        process.kill()
+        process.wait()
+
+    def stop(self, process, usage):
+        # program is asked to finish and killed only if it is not finished in time
+        process.terminate()
+        try:
+            wait_process(process, self.monitor.grace, usage)
+        except subprocess.TimeoutExpired:
+            self.kill(process)
+
+    def attempt(self, cwd, log, usage=None):
+        # returns None if program is finished, otherwise the reason of failure
+        if self.resources is None:
+            return self.execute(cwd, log, usage)
+        cpus = self.resources.acquire(log)
+        try:
+            return self.execute(cwd, log, usage, cpus)
+        finally:
+            self.resources.release(cpus, usage)
+
+    def execute(self, cwd, log, usage=None, cpus=None):
+        directory = cwd if cwd is not None else path_to_solution
+        start = time.time()
+        try:
+            env = self.resources.environment() if self.resources is not None else None
+            process = start_process(path_to_program, cwd, env, cpus)
+        except Exception as e:
+            return 'Cannot execute the program ({}) - UnErr ({}).'.format(path_to_program, e)
+
+        progress = self.progress(directory) if self.stall_timeout else None
+        watch = self.monitor.watch(directory) if self.monitor is not None else None
+        last_change = start
+        while True:
+            try:
+                code = wait_process(process, self.poll, usage)
+                break
+            except subprocess.TimeoutExpired:
+                pass
+
+            if watch is not None:
+                reason = watch.check()
+                if reason is not None:
+                    log('Program is stopped early: {}.'.format(reason))
+                    self.stop(process, usage)
+                    self.monitor.record(reason, time.time() - start)
+                    if usage is not None:
+                        usage['stop'] = reason
+                    return None
+
+            now = time.time()
+            if self.timeout is not None and now - start > self.timeout:
+                self.kill(process)
+                self.count('timeouts')
+                return 'Program is killed after {:.0f} s, timeout is {} s.'.format(now - start, self.timeout)
+
+            if self.stall_timeout is not None:
+                current = self.progress(directory)
+                if current != progress:
+                    progress, last_change = current, now
+                elif now - last_change > self.stall_timeout:
+                    self.kill(process)
+                    self.count('stalls')
+                    return 'Program is killed, output files are not changed for {:.0f} s.'.format(now - last_change)
+
+        if self.check_returncode and code != 0:
+            return 'Program is finished with exit code {}.'.format(code)
+        if self.monitor is not None:
+            self.monitor.record(None, time.time() - start)
+        return None
+
+    def run(self, cwd, log, usage=None):
+        for attempt in range(self.retries + 1):
+            if attempt > 0:
+                delay = self.backoff * 2 ** (attempt - 1)
+                log('Retry {} of {} in {} s.'.format(attempt, self.retries, delay))
+                self.count('repeats')
+                time.sleep(delay)
+
+            reason = self.attempt(cwd, log, usage)
+            if reason is None:
+                return 0
+            log('[ERROR] {}'.format(reason))
+
+        self.count('failures')
+        log('[ERROR] Program failed, attempts: {}. Point is marked as failed.'.format(self.retries + 1))
+        return 1
+
+
+class Journal:
+
+    def __init__(self, journal_filename, resume=False):
+        self.journal_filename = journal_filename
+        self.lock = threading.Lock()
+        self.finished = {}
+
+        self.journal_fd = os.open(
+            self.journal_filename,
+            os.O_WRONLY | os.O_APPEND | os.O_CREAT | getattr(os, 'O_BINARY', 0),
+            0o644
+        )
+        self.repair()
+
+        if resume:
+            self.load()
+
+    def __del__(self):
+        self.close()
+
+    @staticmethod
+    def point_key(point):
+        return ';'.join('{}={}'.format(name, value) for name, value in point)
+
+    def repair(self):
+        # the last record is incomplete if writing of it was interrupted, it is cut off
+        if os.fstat(self.journal_fd).st_size == 0:
+            return
+        with open(self.journal_filename, 'rb') as journal_file:
+            data = journal_file.read()
+        if not data.endswith(b'\n'):
+            os.ftruncate(self.journal_fd, data.rfind(b'\n') + 1)
+
+    def load(self):
+        with open(self.journal_filename) as journal_file:
+            for line in journal_file:
+                fields = line.rstrip('\n').split('\t')
+                if len(fields) == 3:
+                    self.finished[fields[0]] = (fields[1], int(fields[2]))
+
+    def done(self, point):
+        return self.point_key(point) in self.finished
+
+    def complete(self, point, parameters):
+        # all points of the subtest started at given point are finished
+        grid = Grid(*parameters)
+        for flat in grid.indices():
+            if not self.done(point + grid.named(flat)):
+                return False
+        return True
+
+    def record(self, point, directory, i):
+        key = point if isinstance(point, str) else self.point_key(point)
+        line = '{}\t{}\t{}\n'.format(key, directory, i).encode('utf-8')
+
+        # every record is written by single call and is on disk before next point is started
+        with self.lock:
+            os.write(self.journal_fd, line)
+            os.fsync(self.journal_fd)
+            self.finished[key] = (directory, i)
+
+    def close(self):
+        with self.lock:
+            if self.journal_fd is not None:
+                os.close(self.journal_fd)
+                self.journal_fd = None
+
+
+class SettingsDocument:
+    line_re = re.compile(r'^(\w+)(\s*=\s*)([\w\+\-\.]*)(.*)$', re.S)
+
+    def __init__(self, filename):
+        self.filename = filename
+        self.index = {}
+
+        with open(self.filename) as settings_file:
+            self.lines = settings_file.readlines()
+
+        # every parameter is mapped to numbers of lines where it is set
+        for n, line in enumerate(self.lines):
+            match = self.line_re.match(line)
+            if match is not None:
+                self.index.setdefault(match.group(1), []).append(n)
+
+    def __contains__(self, parameter):
+        return parameter in self.index
+
+    def copy(self):
+        document = copy.copy(self)
+        document.lines = list(self.lines)
+        return document
+
+    def get(self, parameter):
+        if parameter not in self.index:
+            raise KeyError('SettingsDocument(): parameter {} is not found in {}'.format(parameter, self.filename))
+        return self.line_re.match(self.lines[self.index[parameter][-1]]).group(3)
+
+    def set(self, parameter, value):
+        self.update([(parameter, value)])
+
+    def update(self, overrides):
+        if isinstance(overrides, dict):
+            overrides = overrides.items()
+        overrides = list(overrides)
+
+        # nothing is changed if at least one parameter is unknown
+        for parameter, _ in overrides:
+            if parameter not in self.index:
+                raise KeyError('SettingsDocument(): parameter {} is not found in {}'.format(parameter, self.filename))
+
+        for parameter, value in overrides:
+            for n in self.index[parameter]:
+                match = self.line_re.match(self.lines[n])
+                self.lines[n] = match.group(1) + match.group(2) + str(value) + match.group(4)
+
+    def save(self, filename=None):
+        if filename is None:
+            filename = self.filename
+
+        # the file is replaced at once, so program never reads partially written settings
+        temp = '{}.tmp{}_{}'.format(filename, os.getpid(), threading.get_ident())
+        with open(temp, 'w') as settings_file:
+            settings_file.writelines(self.lines)
+            settings_file.flush()
+            os.fsync(settings_file.fileno())
+        os.replace(temp, filename)
+
+
+class Archiver:
+
+    def __init__(self, workers=2, queue_size=4, staging_dir=None):
+        # results of run are moved into staging dir at once, copying into directory for results is done by workers
+        # while program is executed for the next point; at most queue_size runs are waiting for workers
+        self.staging_dir = staging_dir if staging_dir is not None else path_to_archive_dir
+        self.executor = ThreadPoolExecutor(max_workers=workers)
+        self.slots = threading.BoundedSemaphore(workers + queue_size)
+        self.lock = threading.Lock()
+        self.futures = []
+        self.numbers = itertools.count(1)
+        self.failures = 0
+
+    def __del__(self):
+        self.close()
+
+    def stage(self, source_dir, settings_source, delete, log):
+        staging = os.path.join(self.staging_dir, '{}_{}'.format(os.getpid(), next(self.numbers)))
+        os.makedirs(staging)
+        shutil.copy(settings_source, os.path.join(staging, settings_filename))
+
+        # files are renamed inside the same volume, so the next run can start in source dir
+        names = list(files_for_save)
+        if delete:
+            names += [filename for filename in files_for_delete if filename not in names]
+        for filename in names:
+            source = os.path.join(source_dir, filename)
+            try:
+                os.replace(source, os.path.join(staging, filename))
+            except FileNotFoundError:
+                pass
+            except OSError:
+                # staging dir is on another volume
+                try:
+                    shutil.move(source, os.path.join(staging, filename))
+                except Exception as e:
+                    log('Cannot move results of experiment ({}) into staging dir ({}) - UnErr {}.'.format(
+                        source, staging, e
+                    ))
+        return staging
+
+    def submit(self, i, directory, source_dir=None, settings_source=None, delete=True, log=None, finished=None):
+        # finished() is called by worker when results are in directory for results
+        if source_dir is None:
+            source_dir = path_to_solution
+        if settings_source is None:
+            settings_source = path_to_settings
+        if log is None:
+            log = print_m
+
+        self.slots.acquire()
+        try:
+            staging = self.stage(source_dir, settings_source, delete, log)
+        except Exception as e:
+            self.slots.release()
+            log('[ERROR] Cannot prepare results for archiving ({}) - UnErr ({}). Results are saved at once.'.format(
+                self.staging_dir, e
+            ))
+            save_results(i, directory, source_dir, settings_source, delete, log)
+            if finished is not None:
+                finished()
+            return
+
+        fields = getattr(log_context, 'fields', {})
+
+        def archive():
+            log_context.fields = fields
+            try:
+                save_results(i, directory, staging, os.path.join(staging, settings_filename), False, log, True)
+                shutil.rmtree(staging, ignore_errors=True)
+                if finished is not None:
+                    finished()
+            except Exception as e:
+                log('[ERROR] Cannot archive results of iteration {} ({}) - UnErr ({}).'.format(i, staging, e))
+                with self.lock:
+                    self.failures += 1
+            finally:
+                log_context.fields = {}
+                self.slots.release()
+
+        with self.lock:
+            self.futures = [f for f in self.futures if not f.done()]
+            self.futures.append(self.executor.submit(archive))
+
+    def wait(self):
+        # waits for all results submitted before, returns number of failed runs
+        with self.lock:
+            futures = self.futures
+            self.futures = []
+        for future in futures:
+            future.result()
+        with self.lock:
+            failures = self.failures
+            self.failures = 0
+        return failures
+
+    def close(self):
+        if self.executor is None:
+            return 0
+        failures = self.wait()
+        self.executor.shutdown()
+        self.executor = None
+        try:
+            os.rmdir(self.staging_dir)
+        except OSError:
+            pass
+        return failures
+
+
+def format_time(seconds):
+    seconds = int(round(seconds))
+    return '{}:{:02d}:{:02d}'.format(seconds // 3600, seconds // 60 % 60, seconds % 60)
+
+
+class Progress:
+
+    def __init__(self, total):
+        # estimated time is measured throughput of the runs finished so far, so it includes parallel runs
+        self.total = total
+        self.done = 0
+        self.failed = 0
+        self.start = time.time()
+        self.lock = threading.Lock()
+
+    def finished(self, res=0):
+        with self.lock:
+            self.done += 1
+            if res != 0:
+                self.failed += 1
+        return self.message(res)
+
+    def eta(self):
+        if self.done == 0:
+            return None
+        return (time.time() - self.start) / self.done * (self.total - self.done)
+
+    def message(self, res=0):
+        eta = self.eta()
+        return '{}/{} runs finished{}, ETA {}'.format(
+            self.done, self.total, '' if res == 0 else ' (with errors)', 'unknown' if eta is None else format_time(eta)
+        )
+
+
+class ConcurrencyTuner:
+
+    def __init__(self, max_workers, log, runs_per_level=None, gain=0.05):
+        # the first runs of test are executed with 1, 2, 4, ... max_workers at once while runs per hour are growing
+        # by more than gain, then the best number of workers is kept till the end of test
+        self.levels = []
+        level = 1
+        while level < max_workers:
+            self.levels.append(level)
+            level *= 2
+        self.levels.append(max_workers)
+
+        self.log = log
+        self.runs_per_level = runs_per_level
+        self.gain = gain
+        self.k = 0
+        self.limit = self.levels[0]
+        self.tuned = len(self.levels) == 1
+        self.active = 0
+        self.walls = []
+        self.rates = {}
+        self.condition = threading.Condition()
+
+    def enter(self):
+        with self.condition:
+            while self.active >= self.limit:
+                self.condition.wait()
+            self.active += 1
+            return self.limit, time.time()
+
+    def leave(self, token):
+        # only runs started with the current number of workers are measured
+        level, start = token
+        with self.condition:
+            self.active -= 1
+            if not self.tuned and level == self.limit:
+                self.walls.append(time.time() - start)
+                if len(self.walls) >= (self.runs_per_level or 2 * level):
+                    self.measured(level)
+            self.condition.notify_all()
+
+    def measured(self, level):
+        # runs per hour of level workers which are busy all the time
+        self.rates[level] = level * 3600.0 / (sum(self.walls) / len(self.walls))
+        self.walls = []
+        self.log('Concurrency {}: {:.1f} runs per hour.'.format(level, self.rates[level]))
+
+        previous = self.levels[self.k - 1] if self.k > 0 else None
+        if previous is not None and self.rates[level] < self.rates[previous] * (1 + self.gain):
+            self.limit = previous if self.rates[previous] >= self.rates[level] else level
+            self.tuned = True
+        elif self.k + 1 == len(self.levels):
+            self.tuned = True
+        else:
+            self.k += 1
+            self.limit = self.levels[self.k]
+        if self.tuned:
+            self.log('Concurrency is set to {} workers.'.format(self.limit))
+
+
+class SweepPlan:
+
+    def __init__(self, parameters, dir_name, order=None):
+        # runs are (n, named_point, i, directory), named point is also the list of overrides of settings
+        self.grid = Grid(*parameters)
+        self.dir_name = dir_name
+        self.runs = []
+        for flat in self.grid.indices():
+            named_point = self.grid.named(flat)
+            self.runs.append(
+                (flat + 1, named_point, self.grid.coordinates(flat)[-1] + 1, point_directory(dir_name, named_point))
+            )
+
+        # order is 'reverse' or a key of named point, e.g. expensive points first for better load balance:
+        # order=lambda point: -dict(point)['FlucNx']
+        if order == 'reverse':
+            self.runs.reverse()
+        elif order is not None:
+            self.runs.sort(key=lambda run: order(run[1]))
+
+    def __len__(self):
+        return len(self.runs)
+
+    def __iter__(self):
+        return iter(self.runs)
+
+    def directories(self):
+        # one directory for every value of all parameters except the last
+        return [
+            point_directory(self.dir_name, self.grid.named(flat))
+            for flat in range(0, len(self.grid), self.grid.shape()[-1])
+        ]
+
+    def pending(self, journal):
+        return [run for run in self.runs if not journal.done(run[1])]
+
+    def describe(self, log, workers=1, run_time=None, limit=20):
+        log('Plan: {} runs in {} directories, {}.'.format(
+            len(self.runs), len(self.directories()),
+            ', '.join('{} ({} values)'.format(name, n) for name, n in zip(self.grid.names(), self.grid.shape()))
+        ))
+        for n, named_point, i, directory in self.runs[:limit]:
+            log('Run {}: {} -> {}.'.format(n, Journal.point_key(named_point), os.path.join(directory, '{}_*'.format(i))))
+        if len(self.runs) > limit:
+            log('... and {} runs more.'.format(len(self.runs) - limit))
+        if run_time is not None:
+            log('Estimated time: {} ({} s per run, {} workers).'.format(
+                format_time(run_time * math.ceil(len(self.runs) / float(workers))), run_time, workers
+            ))
+
+    def lines(self):
+        # directories are relative to directory of test, so hosts which mount it under different paths have the
+        # same plan
+        return [
+            '{}\t{}\t{}\t{}\n'.format(
+                n, Journal.point_key(named_point), os.path.relpath(directory, self.dir_name).replace(os.sep, '/'), i
+            )
+            for n, named_point, i, directory in self.runs
+        ]
+
+    def write(self, filename):
+        with open(filename, 'w') as plan_file:
+            plan_file.writelines(self.lines())
+
+
+class ClaimBoard:
+
+    def __init__(self, claims_dir, shard, lease=600.0):
+        # run is claimed by creating its lock file exclusively, the lock is refreshed while run is executed;
+        # a lock which is not refreshed for lease seconds belongs to a dead shard and can be taken over
+        self.claims_dir = claims_dir
+        self.shard = shard
+        self.lease = lease
+        self.lock = threading.Lock()
+        self.claimed = set()
+        self.stopped = threading.Event()
+
+        os.makedirs(self.claims_dir, exist_ok=True)
+        self.heartbeat = threading.Thread(target=self.refresh, daemon=True)
+        self.heartbeat.start()
+
+    def __del__(self):
+        self.close()
+
+    def path(self, n, kind='lock'):
+        return os.path.join(self.claims_dir, '{}.{}'.format(n, kind))
+
+    def is_done(self, n):
+        return os.path.exists(self.path(n, 'done'))
+
+    def claim(self, n):
+        if self.is_done(n):
+            return False
+        lock = self.path(n)
+        for attempt in range(2):
+            try:
+                fd = os.open(lock, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o644)
+            except FileExistsError:
+                if attempt != 0 or not self.expired(lock):
+                    return False
+                continue
+            try:
+                os.write(fd, '{}\n'.format(self.shard).encode('utf-8'))
+            finally:
+                os.close(fd)
+            # run could be finished by other shard just before the lock is taken
+            if self.is_done(n):
+                self.release(n)
+                return False
+            with self.lock:
+                self.claimed.add(n)
+            return True
+        return False
+
+    def expired(self, lock):
+        # stale lock is renamed to a name of this shard first, only one shard can rename it; the renamed file is
+        # checked again, a lock which is refreshed or taken over after the first check is restored
+        try:
+            stat = os.stat(lock)
+            if time.time() - stat.st_mtime <= self.lease:
+                return False
+            with open(lock) as lock_file:
+                owner = lock_file.read()
+        except OSError:
+            return False
+
+        stale = '{}.stale_{}_{}_{}'.format(lock, self.shard, os.getpid(), threading.get_ident())
+        try:
+            os.rename(lock, stale)
+        except OSError:
+            return False
+        try:
+            renamed = os.stat(stale)
+            with open(stale) as lock_file:
+                taken = lock_file.read() != owner
+            if taken or renamed.st_mtime != stat.st_mtime or time.time() - renamed.st_mtime <= self.lease:
+                # the lock is restored only if no other lock was created in the meantime
+                try:
+                    os.link(stale, lock)
+                except OSError:
+                    pass
+                return False
+            return True
+        except OSError:
+            return False
+        finally:
+            try:
+                os.remove(stale)
+            except OSError:
+                pass
+
+    def fail(self, n):
+        # every failed attempt adds a line with name of shard
+        with open(self.path(n, 'failed'), 'a') as failed_file:
+            failed_file.write('{}\n'.format(self.shard))
+
+    def failures(self, n):
+        try:
+            with open(self.path(n, 'failed')) as failed_file:
+                return len(failed_file.readlines())
+        except OSError:
+            return 0
+
+    def is_live(self, n):
+        # run is executed by other shard which refreshes its lock; lock which is not refreshed for half of lease
+        # could belong to a dead shard, it is waited for and taken over when lease expires
+        try:
+            stat = os.stat(self.path(n))
+        except OSError:
+            return False
+        return self.owner(n) != self.shard and time.time() - stat.st_mtime <= self.lease / 2.0
+
+    def owner(self, n):
+        try:
+            with open(self.path(n)) as lock_file:
+                return lock_file.read().strip()
+        except OSError:
+            return None
+
+    def done(self, n):
+        with open(self.path(n, 'done'), 'w') as done_file:
+            done_file.write('{}\n'.format(self.shard))
+        self.release(n)
+
+    def release(self, n):
+        with self.lock:
+            self.claimed.discard(n)
+        if self.owner(n) == self.shard:
+            try:
+                os.remove(self.path(n))
+            except OSError:
+                pass
+
+    def refresh(self):
+        while not self.stopped.wait(self.lease / 4.0):
+            with self.lock:
+                claimed = list(self.claimed)
+            for n in claimed:
+                try:
+                    os.utime(self.path(n), None)
+                except OSError:
+                    pass
+
+    def close(self):
+        self.stopped.set()
+
+
+class HarvestStats:
+    kinds = ('renamed', 'linked', 'cloned', 'copied')
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.files = dict((kind, 0) for kind in self.kinds)
+        self.bytes = dict((kind, 0) for kind in self.kinds)
+
+    def add(self, kind, size):
+        with self.lock:
+            self.files[kind] += 1
+            self.bytes[kind] += size
+
+    def snapshot(self):
+        with self.lock:
+            return dict(self.bytes), dict(self.files)
+
+    def report(self, log, since=None):
+        # bytes which were not copied, since the last snapshot if it is given
+        with self.lock:
+            nbytes = dict(self.bytes)
+            files = dict(self.files)
+        if since is not None:
+            for kind in self.kinds:
+                nbytes[kind] -= since[0][kind]
+                files[kind] -= since[1][kind]
+        if sum(files.values()) == 0:
+            return
+        log('Harvest of results: {} bytes copied, {} bytes avoided ({}).'.format(
+            nbytes['copied'], nbytes['renamed'] + nbytes['linked'] + nbytes['cloned'],
+            ', '.join('{} {} files'.format(kind, files[kind]) for kind in self.kinds if files[kind] != 0)
+        ))
+
+
+class SweepMaps:
+
+    def __init__(self, parameters, reducers, processes=0, filename=None, save_interval=10.0):
+        # reducers are {name: (function, result file)}, function(path) gives a number from one result file, e.g.
+        # {'RC_max': (resultreader.maximum, 'RC_Line.txt')}; they are executed in threads of this process while the
+        # test is running; processes=N executes them in N other processes, then they must be module-level
+        # functions and the script must start tests under if __name__ == '__main__' (processes of Windows import
+        # the script again)
+        self.grid = parameters if isinstance(parameters, Grid) else Grid(*parameters)
+        self.reducers = dict(reducers)
+        self.filename = filename
+        self.save_interval = save_interval
+        self.lock = threading.Lock()
+        self.values = dict((name, [float('nan')] * len(self.grid)) for name in self.reducers)
+        self.errors = 0
+        self.saved = time.time()
+        if not processes:
+            self.executor = ThreadPoolExecutor(max_workers=os.cpu_count() or 1)
+        else:
+            self.executor = ProcessPoolExecutor(max_workers=processes)
+
+    def submit(self, named_point, directory, i, log):
+        flat = self.grid.index_of(tuple(value for _, value in named_point))
+        for name, (function, filename) in self.reducers.items():
+            path = os.path.join(directory, '{}_{}'.format(i, filename))
+            future = self.executor.submit(function, path)
+            future.add_done_callback(
+                lambda future, name=name, path=path: self.reduced(future, name, flat, path, log)
+            )
+
+    def reduced(self, future, name, flat, path, log):
+        try:
+            value = future.result()
+        except Exception as e:
+            log('[ERROR] Cannot reduce results ({}) by {} - UnErr ({}).'.format(path, name, e))
+            with self.lock:
+                self.errors += 1
+            return
+        with self.lock:
+            self.values[name][flat] = value
+            save = self.filename is not None and time.time() - self.saved >= self.save_interval
+            if save:
+                self.saved = time.time()
+        if save:
+            self.save()
+
+    def map(self, name):
+        # values of reducer as nested lists indexed by coordinates of parameters
+        with self.lock:
+            values = list(self.values[name])
+        for n in reversed(self.grid.shape()[1:]):
+            values = [values[k:k + n] for k in range(0, len(values), n)]
+        return values
+
+    def at(self, name, **point):
+        flat = self.grid.index_of(tuple(point[n] for n in self.grid.names()))
+        with self.lock:
+            return self.values[name][flat]
+
+    def save(self, filename=None):
+        filename = filename if filename is not None else self.filename
+        names = sorted(self.reducers)
+        with self.lock:
+            rows = [
+                [str(value) for value in self.grid.point(flat)] + [str(self.values[name][flat]) for name in names]
+                for flat in range(len(self.grid))
+            ]
+        temp = '{}.tmp{}_{}'.format(filename, os.getpid(), threading.get_ident())
+        with open(temp, 'w') as maps_file:
+            maps_file.write('\t'.join(list(self.grid.names()) + names) + '\n')
+            for row in rows:
+                maps_file.write('\t'.join(row) + '\n')
+        os.replace(temp, filename)
+
+    def close(self):
+        # waits for all reducers, returns number of errors
+        self.executor.shutdown()
+        if self.filename is not None:
+            self.save()
+        return self.errors
+
 
 def print_m(m):
     print(m)
 
 
 def set_parameter_in_file(filename, parameter, value):
-    settings_file = open(filename)
-    settings = settings_file.readlines()
-    settings_file.close()
-
-    for line in settings:
-        settings[settings.index(line)] = re.sub(
-            r'^('+parameter+r'\s*=\s*)([\w\+\-\.]*)(\s*;?.*)?$',
-            r'\g<1>'+str(value)+r'\g<3>',
-            line
-        )
-
-    settings_file = open(filename, 'w')
-    settings_file.writelines(settings)
-    return settings
+    settings = SettingsDocument(filename)
+    settings.set(parameter, value)
+    settings.save()
+    return settings.lines
 
 
 def set_parameter(parameter, value):
     return set_parameter_in_file(path_to_settings, parameter, value)
 
 
-def parameter_test(parameter, directory=None, log=print_m):
+def execute_program(cwd=None, cache=None, log=print_m, scheduler=None, usage=None):
+    # usage is filled with status, time and resources used by program, if it is given
+    if usage is None:
+        usage = {}
+    sweep_status.started(id(usage), usage.get('point'))
+    try:
+        return run_program(cwd, cache, log, scheduler, usage)
+    finally:
+        sweep_status.finished(id(usage), usage)
+
+
+def run_program(cwd, cache, log, scheduler, usage):
+    directory = cwd if cwd is not None else path_to_solution
+
+    key = None
+    if cache is not None:
+        try:
+            key = cache.key(os.path.join(directory, settings_filename))
+            if cache.restore(key, directory):
+                log('Results are restored from cache ({}).'.format(key))
+                usage['status'] = 'cached'
+                return 0
+        except Exception as e:
+            log('[ERROR] Cannot use cache of results ({}) - UnErr ({}).'.format(cache.cache_dir, e))
+            key = None
+
+    log('Execution of program.')
     start_time = time.time()
+    usage['status'] = 'failed'
+    if scheduler is not None:
+        res = scheduler.run(cwd, log, usage)
+    else:
+        try:
+            process = subprocess.Popen(path_to_program, cwd=cwd)
+            wait_process(process, usage=usage)
+            res = 0
+        except Exception as e:
+            log('[ERROR] Cannot execute the program ({}) - UnErr ({}).'.format(
+                path_to_program, e
+            ))
+            res = 1
+    usage['wall'] = time.time() - start_time
+    if res != 0:
+        return 1
 
-    timestamp = time.strftime('%Y%m%d%H%M%S', time.localtime())
-    if directory is None:
-        directory = path_to_result_dir + '{}_parameter_test_{}'.format(timestamp, parameter.name())
+    log('Execution finished.')
+    usage['status'] = 'ok'
+    usage['output_bytes'] = sum(
+        os.path.getsize(os.path.join(directory, filename))
+        for filename in files_for_save if os.path.isfile(os.path.join(directory, filename))
+    )
 
-    log('Parameter test is started.')
+    # results of run stopped early by monitor are not complete, they are never saved into cache
+    if key is not None and usage.get('stop'):
+        log('Results of stopped run are not saved into cache.')
+    elif key is not None:
+        try:
+            cache.store(key, directory)
+        except Exception as e:
+            log('[ERROR] Cannot save results into cache ({}) - UnErr ({}).'.format(cache.cache_dir, e))
+    return 0
+
+
+# Bytes of results harvested by every kind of transfer, since the start of program
+harvest_stats = HarvestStats()
+
+# Progress of the current test, it is served by StatusServer
+sweep_status = SweepStatus()
+
+
+def open_status(status, log=print_m):
+    # status=True serves progress on status_port, status=<port> on the given port
+    if status is None or status is False or isinstance(status, StatusServer):
+        return None
+    port = status_port if status is True else status
     try:
-        os.makedirs(directory)
+        server = StatusServer(sweep_status, port)
     except OSError as e:
-        log('[ERROR] Cannot create directory for results ({}) - {}.'.format(
-            repr(directory), os.strerror(e.errno)
+        log('[ERROR] Cannot start server of progress (port {}) - {}.'.format(port, e))
+        return None
+    log('Progress of test: http://127.0.0.1:{}/ (JSON), http://127.0.0.1:{}/metrics (Prometheus).'.format(
+        server.port, server.port
+    ))
+    return server
+
+
+def clone_file(source, destination):
+    # copy-on-write clone (reflink), it is supported by Btrfs and XFS on Linux only
+    if not sys.platform.startswith('linux'):
+        return False
+    import fcntl
+    ficlone = 0x40049409
+    with open(source, 'rb') as source_file, open(destination, 'wb') as destination_file:
+        try:
+            fcntl.ioctl(destination_file.fileno(), ficlone, source_file.fileno())
+            return True
+        except OSError:
+            return False
+
+
+def copy_verified(source, destination, block_size=1024 * 1024):
+    # streaming copy, the copy is compared with the source by size and by checksum of contents
+    source_hash = hashlib.sha256()
+    with open(source, 'rb') as source_file, open(destination, 'wb') as destination_file:
+        for block in iter(lambda: source_file.read(block_size), b''):
+            source_hash.update(block)
+            destination_file.write(block)
+        size = source_file.tell()
+        destination_file.flush()
+        os.fsync(destination_file.fileno())
+
+    if os.path.getsize(destination) != size:
+        raise OSError(errno.EIO, 'Size of copy differs from size of source', destination)
+    if harvest_verify == 'checksum':
+        destination_hash = hashlib.sha256()
+        with open(destination, 'rb') as destination_file:
+            for block in iter(lambda: destination_file.read(block_size), b''):
+                destination_hash.update(block)
+        if destination_hash.digest() != source_hash.digest():
+            raise OSError(errno.EIO, 'Checksum of copy differs from checksum of source', destination)
+    try:
+        shutil.copystat(source, destination)
+    except OSError:
+        pass
+
+
+def harvest_file(source, destination, copy=False, stats=None, link=False):
+    # the cheapest transfer of file: rename (move) or hardlink (copy of file which is never changed, link=True)
+    # inside the same volume, reflink where it is supported, otherwise verified copy; returns the kind of transfer
+    if stats is None:
+        stats = harvest_stats
+    size = os.path.getsize(source)
+
+    if not copy:
+        try:
+            os.replace(source, destination)
+            stats.add('renamed', size)
+            return 'renamed'
+        except OSError as e:
+            if e.errno != errno.EXDEV:
+                raise
+
+    # file is prepared under temporary name, so destination is never partially written
+    temp = '{}.tmp{}_{}'.format(destination, os.getpid(), threading.get_ident())
+    kind = None
+    try:
+        if copy and link and harvest_links:
+            try:
+                os.link(source, temp)
+                kind = 'linked'
+            except OSError:
+                pass
+        if kind is None and clone_file(source, temp):
+            kind = 'cloned'
+        if kind is None:
+            try:
+                copy_verified(source, temp)
+            except OSError:
+                # the second attempt, e.g. after a short failure of network volume
+                copy_verified(source, temp)
+            kind = 'copied'
+        os.replace(temp, destination)
+    finally:
+        if os.path.exists(temp):
+            os.remove(temp)
+
+    if not copy:
+        os.remove(source)
+    stats.add(kind, size)
+    return kind
+
+
+def save_results(i, directory, source_dir=None, settings_source=None, delete=True, log=print_m, link_settings=False):
+    if source_dir is None:
+        source_dir = path_to_solution
+    if settings_source is None:
+        settings_source = path_to_settings
+
+    # copying file with settings into directory for results
+    settings_destination = os.path.join(directory, "{}_{}".format(i, settings_filename))
+
+    try:
+        harvest_file(settings_source, settings_destination, copy=True, link=link_settings)
+    except IOError as e:
+        log('[ERROR] Cannot copy file with settings ({}) into directory for results ({}) - {}'.format(
+            settings_source, settings_destination, os.strerror(e.errno)
         ))
-        return 1
     except Exception as e:
-        log('[ERROR] Cannot create directory for results ({}) - UnErr ({}).'.format(
-            repr(directory), e.message
+        log('[ERROR] Cannot copy file with settings ({}) into directory for results ({}) - UnErr ({})'.format(
+            settings_source, settings_destination, e
         ))
-        return 1
-    log('Directory for results is created: {}.'.format(directory))
-    directory += '\\'
 
-    # main cycle for experiment
-    i = 1
-    for value in parameter.values():
-        log('Iteration {}: {}={}.'.format(i, parameter.name(), value))
+    log('Copy of settings file is saved in directory for results ({}).'.format(settings_destination))
+
+    # moving files with results of experiment from files_for_save list into directory for results
+    for filename in files_for_save:
+        source = os.path.join(source_dir, filename)
+        destination = os.path.join(directory, "{}_{}".format(i, filename))
 
-        # setting the value of parameter given as arguments in file with settings
         try:
-            set_parameter(parameter.name(), value)
-        except OSError as e:
-            log('[ERROR] Cannot set parameter is settings file ({}) - {}.'.format(
-                path_to_settings, os.strerror(e.errno)
+            harvest_file(source, destination)
+        except IOError as e:
+            log('Cannot copy results of experiment ({}) into directory for results ({}) - {}.'.format(
+                source, destination, os.strerror(e.errno)
             ))
-            return 1
         except Exception as e:
-            log('[ERROR] Cannot set parameter is settings file ({}) - UnErr ({}).'.format(
-                path_to_settings, e.message
+            log('Cannot copy results of experiment ({}) into directory for results ({}) - UnErr {}.'.format(
+                source, destination, e
             ))
-            return 1
 
-        # executing of program
-        log('Execution of program.')
+    # removing files with results of experiment from files_for_delete list
+    for filename in files_for_delete if delete else []:
+        source = os.path.join(source_dir, filename)
         try:
-            process = subprocess.Popen(path_to_program)
-            process.communicate()
+            os.remove(source)
+        except IOError as e:
+            log('Cannot remove results of experiment ({}) - {}.'.format(
+                source, os.strerror(e.errno)
+            ))
         except Exception as e:
-            log('[ERROR] Cannot execute the program ({}) - UnErr ({}).'.format(
-                path_to_program, e.message
+            log('Cannot remove results of experiment ({}) - UnErr {}.'.format(
+                source, e
             ))
-            return 1
 
-        log('Execution finished.')
 
-        # copying file with settings into directory for results
-        settings_source = path_to_settings
-        settings_destination = directory + "{}_{}".format(i, settings_filename)
+def parameter_test(parameter, directory=None, log=print_m, cache=None, store=None, scheduler=None, metrics=None,
+                   archiver=None, index=None):
+    # one parameter is tested by the engine of sweep_parameters_test, results are saved in directory
+    if directory is None:
+        timestamp = time.strftime('%Y%m%d%H%M%S', time.localtime())
+        directory = path_to_result_dir + '{}_parameter_test_{}'.format(timestamp, parameter.name())
+    return sweep_parameters_test(
+        parameter, res_dir=directory, log=log, caller='parameter_test', workers=0, cache=cache, store=store,
+        scheduler=scheduler, metrics=metrics, archive=archiver, index=index
+    )
 
-        try:
-            shutil.copy(settings_source, settings_destination)
-        except IOError as e:
-            log('[ERROR] Cannot copy file with settings ({}) into directory for results ({}) - {}'.format(
-                settings_source, settings_destination, os.strerror(e.errno)
-            ))
-        except Exception as e:
-            log('[ERROR] Cannot copy file with settings ({}) into directory for results ({}) - UnErr ({})'.format(
-                settings_source, settings_destination, e.message
-            ))
 
-        log('Copy of settings file is saved in directory for results ({}).'.format(settings_destination))
+def n_parameters_test(*args, **kwargs):
+    # points are executed one by one in path_to_solution by the engine of sweep_parameters_test, the layout of
+    # results is dir\{name}={value}\...\{i}_* as before
+    kwargs['caller'] = 'n_parameters_test'
+    kwargs['workers'] = 0
+    return sweep_parameters_test(*args, **kwargs)
+
+
+def point_directory(dir_name, named_point):
+    # the same layout as n_parameters_test: name=value directory for every parameter except the last
+    directory = dir_name
+    for name, value in named_point[:-1]:
+        directory = os.path.join(directory, '{}={}'.format(name, value))
+    return directory
+
+
+def open_index(index, dir_name, log=print_m):
+    # index=True opens index of root directory for results, which is the parent directory of test
+    if index is None:
+        index = index_results
+    if index is not True:
+        return index or None
+    filename = os.path.join(os.path.dirname(os.path.normpath(dir_name)), index_filename)
+    try:
+        return RunIndex(filename)
+    except Exception as e:
+        log('[ERROR] Cannot open index of runs ({}) - UnErr ({}).'.format(filename, e))
+        return None
 
-        # moving files with results of experiment from files_for_save list into directory for results
-        for filename in files_for_save:
-            source = path_to_solution + filename
-            destination = directory + "{}_{}".format(i, filename)
 
-            try:
-                shutil.move(source, destination)
-            except IOError as e:
-                log('Cannot copy results of experiment ({}) into directory for results ({}) - {}.'.format(
-                    source, destination, os.strerror(e.errno)
-                ))
-            except Exception as e:
-                log('Cannot copy results of experiment ({}) into directory for results ({}) - UnErr {}.'.format(
-                    source, destination, e.message
-                ))
+def index_run(index, named_point, directory, i, usage, log=print_m):
+    if index is None:
+        return
+    settings = os.path.join(directory, '{}_{}'.format(i, settings_filename))
+    files = [os.path.join(directory, '{}_{}'.format(i, filename)) for filename in files_for_save]
+    try:
+        index.add(
+            named_point, directory, i, usage.get('status', 'ok'),
+            file_hash(settings) if os.path.isfile(settings) else None, usage.get('wall'),
+            [path for path in files if os.path.isfile(path)]
+        )
+    except Exception as e:
+        log('[ERROR] Cannot add run into index ({}) - UnErr ({}).'.format(index.filename, e))
 
-        # removing files with results of experiment from files_for_delete list
-        for filename in files_for_delete:
-            source = path_to_solution + filename
-            try:
-                os.remove(source)
-            except IOError as e:
-                log('Cannot remove results of experiment ({}) - {}.'.format(
-                    source, os.strerror(e.errno)
-                ))
-            except Exception as e:
-                log('Cannot remove results of experiment ({}) - UnErr {}.'.format(
-                    source, e.message
-                ))
 
-        # increasing iteration counter
-        i += 1
+def isolated_run(n, named_point, i, directory, scratch_dir, document=None, cache=None, log=print_m, scheduler=None,
+                 metrics=None, index=None):
+    # program is executed in its own directory, so it reads settings from there and writes results there
+    run_dir = os.path.join(scratch_dir, 'run_{}'.format(n))
+    settings = os.path.join(run_dir, settings_filename)
+    usage = {'run': n, 'point': Journal.point_key(named_point)}
 
-    finish_time = time.time()
-    log('Parameter test finished. Seconds elapsed: {}.'.format(finish_time - start_time))
-    return 0
+    start_time = time.time()
+    try:
+        if os.path.isdir(run_dir):
+            shutil.rmtree(run_dir)
+        os.makedirs(run_dir)
+        document = document.copy() if document is not None else SettingsDocument(path_to_settings)
+        document.update(named_point)
+        document.save(settings)
+    except (IOError, OSError, KeyError) as e:
+        log('[ERROR] Cannot prepare directory for run ({}) - {}.'.format(run_dir, e))
+        return 1
+    usage['settings'] = time.time() - start_time
 
+    if execute_program(cwd=run_dir, cache=cache, log=log, scheduler=scheduler, usage=usage) != 0:
+        log('Directory of failed run is kept: {}.'.format(run_dir))
+        if metrics is not None:
+            metrics.record(**usage)
+        index_run(index, named_point, directory, i, usage, log)
+        return 1
 
-def n_parameters_test(*args, **kwargs):
+    # files_for_delete are removed together with directory of run
     start_time = time.time()
-    errors = 0
+    save_results(i, directory, source_dir=run_dir, settings_source=settings, delete=False, log=log, link_settings=True)
+    shutil.rmtree(run_dir, ignore_errors=True)
+    usage['harvest'] = time.time() - start_time
 
-    if 'log' in kwargs:
-        log = kwargs['log']
-    else:
-        log = print_m
+    if metrics is not None:
+        metrics.record(**usage)
+    index_run(index, named_point, directory, i, usage, log)
+    return 0
 
-    if 'res_dir' in kwargs:
-        res_dir = kwargs['res_dir']
-    else:
-        res_dir = None
 
+def parameters_from_args(args, caller, log=print_m):
     parameters = []
+    errors = 0
 
     i = 1
     for arg in args:
@@ -372,282 +1844,1089 @@ def n_parameters_test(*args, **kwargs):
             log('param_{} = {}.'.format(i, arg))
         else:
             errors += 1
-            log('[ERROR] n_parameters_test() given non-Parameter argument no_{}!'.format(i))
+            log('[ERROR] {}() given non-Parameter argument no_{}!'.format(caller, i))
         i += 1
+    return parameters, errors
+
+
+def settings_for_parameters(parameters, log=print_m):
+    # settings file is read once and names of all parameters are checked before the test is started
+    try:
+        document = SettingsDocument(path_to_settings)
+    except IOError as e:
+        log('[ERROR] Cannot read settings file ({}) - {}.'.format(path_to_settings, os.strerror(e.errno)))
+        return None
+    unknown = [parameter.name() for parameter in parameters if parameter.name() not in document]
+    if unknown:
+        log('[ERROR] Parameters {} are not found in settings file ({}).'.format(', '.join(unknown), path_to_settings))
+        return None
+    return document
+
+
+def sweep_metrics(dir_name, log=print_m):
+    # metrics=True creates file with metrics of runs in work dir, they are only kept in memory if it is not possible
+    try:
+        os.makedirs(dir_name, exist_ok=True)
+        return Metrics(os.path.join(dir_name, metrics_filename))
+    except OSError as e:
+        log('[ERROR] Cannot open file with metrics ({}) - {}.'.format(
+            os.path.join(dir_name, metrics_filename), os.strerror(e.errno)
+        ))
+        return Metrics()
+
+
+def run_points(runs, scratch_dir, document=None, cache=None, workers=1, log=print_m, run_log=print_m, finished=None,
+               scheduler=None, metrics=None, index=None, tuner=None):
+    # runs are (n, named_point, i, directory), finished(n, named_point, directory, i, log) is called after every
+    # successful run in its worker thread; tuner limits the number of runs executed at once
+    def run(n, named_point, i, directory):
+        token = tuner.enter() if tuner is not None else None
+        log_context.fields = {'run': n, 'point': dict(named_point)}
+        try:
+            point_log = lambda message: run_log('[{}] {}'.format(n, message))
+            point_log('Run {}: {}.'.format(n, Journal.point_key(named_point).replace(';', ', ')))
+            res = isolated_run(
+                n, named_point, i, directory, scratch_dir, document, cache, point_log, scheduler, metrics, index
+            )
+            if res == 0 and finished is not None:
+                finished(n, named_point, directory, i, point_log)
+            return res
+        finally:
+            log_context.fields = {}
+            if token is not None:
+                tuner.leave(token)
+
+    results = {}
+    progress = Progress(len(runs))
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = dict((executor.submit(run, *r), r[0]) for r in runs)
+        for future in as_completed(futures):
+            try:
+                res = future.result()
+            except Exception as e:
+                res = 1
+                run_log('[ERROR] Run {} failed - UnErr ({}).'.format(futures[future], e))
+            results[futures[future]] = res
+            log('{}.'.format(progress.finished(res)))
+    return results
+
+
+def run_sequential(runs, document, cache=None, log=print_m, run_log=print_m, finished=None, scheduler=None,
+                   metrics=None, archiver=None, index=None):
+    # runs are executed one by one in path_to_solution, settings file is written once for every point with values of
+    # all parameters; without scheduler the first failed run stops the test
+    results = {}
+    progress = Progress(len(runs))
+    for n, named_point, i, directory in runs:
+        log_context.fields = {'run': n, 'point': dict(named_point)}
+        point_log = lambda message, n=n: run_log('[{}] {}'.format(n, message))
+        point_log('Run {}: {}.'.format(n, Journal.point_key(named_point).replace(';', ', ')))
+        usage = {'run': n, 'point': Journal.point_key(named_point)}
+
+        start_time = time.time()
+        try:
+            settings = document.copy()
+            settings.update(named_point)
+            settings.save(path_to_settings)
+        except OSError as e:
+            point_log('[ERROR] Cannot write settings file ({}) - {}.'.format(path_to_settings, os.strerror(e.errno)))
+            results[n] = 1
+            break
+        usage['settings'] = time.time() - start_time
+
+        res = execute_program(cache=cache, log=point_log, scheduler=scheduler, usage=usage)
+        if res == 0:
+            def finish(n=n, named_point=named_point, directory=directory, i=i, point_log=point_log, usage=usage):
+                index_run(index, named_point, directory, i, usage, point_log)
+                if finished is not None:
+                    finished(n, named_point, directory, i, point_log)
+
+            start_time = time.time()
+            if archiver is not None:
+                archiver.submit(i, directory, log=point_log, finished=finish)
+            else:
+                save_results(i, directory, log=point_log)
+                finish()
+            usage['harvest'] = time.time() - start_time
+        else:
+            index_run(index, named_point, directory, i, usage, point_log)
+
+        if metrics is not None:
+            metrics.record(**usage)
+        results[n] = res
+        log('{}.'.format(progress.finished(res)))
+        if res != 0 and scheduler is None:
+            log('[ERROR] Run {} failed, test is stopped.'.format(n))
+            break
+
+    log_context.fields = {}
+    return results
 
+
+def sweep_parameters_test(*args, **kwargs):
+    # the engine of all grid tests (parameter_test, n_parameters_test, coordinates_test_*): all points of test are
+    # planned before the first run, dry_run=True only shows the plan; workers=0 executes program in
+    # path_to_solution, otherwise every run gets its own directory in scratch_dir
+    start_time = time.time()
+    harvested = harvest_stats.snapshot()
+
+    caller = kwargs.get('caller', 'sweep_parameters_test')
+    log = kwargs.get('log', print_m)
+    res_dir = kwargs.get('res_dir')
+    workers = kwargs.get('workers') or 0
+    scratch_dir = kwargs.get('scratch_dir') or path_to_scratch_dir
+    cache = kwargs.get('cache')
+    store = kwargs.get('store')
+    ingested_files = kwargs.get('store_files', store_files)
+    scheduler = kwargs.get('scheduler')
+    metrics = kwargs.get('metrics')
+    archiver = kwargs.get('archive')
+    maps = kwargs.get('maps')
+    index = kwargs.get('index')
+    status = kwargs.get('status')
+    pack = kwargs.get('pack', False)
+    dry_run = kwargs.get('dry_run', False)
+    order = kwargs.get('order')
+    run_time = kwargs.get('run_time')
+
+    # workers='auto' measures runs per hour of the first runs with different numbers of workers and keeps the best
+    tuner = None
+    if workers == 'auto':
+        resources = scheduler.resources if scheduler is not None else None
+        workers = resources.slots if resources is not None and resources.slots else os.cpu_count() or 1
+        tuner = ConcurrencyTuner(workers, log)
+
+    parameters, errors = parameters_from_args(args, caller, log)
     if len(parameters) == 0:
         log('Have no parameters to test. Exit.')
+        return errors
+
+    document = settings_for_parameters(parameters, log)
+    if document is None:
+        return errors + 1
+
+    timestamp = time.strftime('%Y%m%d%H%M%S', time.localtime())
+    if res_dir is None:
+        dir_name = path_to_result_dir + '{}_{}_{}'.format(timestamp, caller, len(parameters))
     else:
-        log_name = 'n{}_{}_{}-{}.txt'.format(
-            len(parameters), parameters[0].name(), parameters[0].begin(), parameters[0].end()
+        dir_name = res_dir
+
+    plan = SweepPlan(parameters, dir_name, order)
+    if dry_run:
+        log('Dry run of {}, nothing is executed.'.format(caller))
+        plan.describe(log, workers or 1, run_time)
+        return errors
+
+    try:
+        for directory in plan.directories():
+            os.makedirs(directory, exist_ok=True)
+        if workers > 0:
+            os.makedirs(scratch_dir, exist_ok=True)
+        plan.write(os.path.join(dir_name, plan_filename))
+    except OSError as e:
+        log('[ERROR] Cannot create directory for results ({}) - {}.'.format(
+            repr(dir_name), os.strerror(e.errno)
+        ))
+        return errors + 1
+
+    log_name = '{}{}_{}_{}-{}.txt'.format(
+        caller[0], len(parameters), parameters[0].name(), parameters[0].begin(), parameters[0].end()
+    )
+    journal = Journal(os.path.join(dir_name, journal_filename), kwargs.get('resume', False))
+    pending = plan.pending(journal)
+
+    own_store = store is True
+    if own_store:
+        store = ResultStore(os.path.join(dir_name, store_filename))
+    # results are parsed into store by its own thread, so the next run is not delayed by them
+    ingest = ThreadPoolExecutor(max_workers=1) if store is not None else None
+    ingesting = []
+
+    own_metrics = metrics is True
+    if own_metrics:
+        metrics = sweep_metrics(dir_name, log)
+
+    # isolated runs are harvested by their worker threads while other runs are executed, archiver is only used by
+    # sequential runs
+    if archiver and workers > 0:
+        log('Archiving of results (archive) is not used with workers > 0, results are saved by worker threads.')
+        archiver = None
+    own_archiver = archiver is True
+    if own_archiver:
+        archiver = Archiver()
+
+    own_index = not isinstance(index, RunIndex)
+    if own_index:
+        index = open_index(index, dir_name, log)
+
+    # maps={name: (function, result file)} reduces results of every run while the test is running
+    own_maps = isinstance(maps, dict)
+    if own_maps:
+        maps = SweepMaps(parameters, maps, filename=os.path.join(dir_name, maps_filename))
+
+    sweep_status.begin(caller, len(plan), len(plan) - len(pending), workers)
+    server = open_status(status, log)
+
+    log_p = Log(os.path.join(dir_name, log_name))
+    log('Starting {}: {} runs ({} finished already), {}{} workers.'.format(
+        caller, len(plan), len(plan) - len(pending), 'up to ' if tuner is not None else '', workers
+    ))
+    log('Work dir: {}.'.format(dir_name))
+    if run_time is not None:
+        log('Estimated time: {}.'.format(format_time(run_time * math.ceil(len(pending) / float(workers or 1)))))
+
+    def finished(n, named_point, directory, i, run_log):
+        journal.record(named_point, directory, i)
+        if ingest is not None:
+            ingesting.append(ingest.submit(store.ingest, named_point, directory, i, ingested_files, run_log))
+        if maps is not None:
+            maps.submit(named_point, directory, i, run_log)
+
+    # runs finished before resuming are reduced too
+    if maps is not None:
+        for n, named_point, i, directory in plan:
+            if journal.done(named_point):
+                maps.submit(named_point, directory, i, log_p.q)
+
+    if workers > 0:
+        results = run_points(
+            pending, scratch_dir, document, cache, workers, log, log_p.q, finished, scheduler, metrics, index, tuner
+        )
+    else:
+        results = run_sequential(
+            pending, document, cache, log, log_p.q, finished, scheduler, metrics, archiver, index
         )
-        log_path = path_to_solution + log_name
+    errors += sum(results.values())
+
+    if archiver is not None:
+        log('Waiting for archiving of results...')
+        errors += archiver.wait()
+        if own_archiver:
+            archiver.close()
+
+    if ingest is not None:
+        log('Waiting for results to be added into store...')
+        ingest.shutdown(wait=True)
+        for future in ingesting:
+            try:
+                errors += future.result()
+            except Exception as e:
+                log('[ERROR] Cannot add results into store ({}) - UnErr ({}).'.format(store.filename, e))
+                errors += 1
 
-        timestamp = time.strftime('%Y%m%d%H%M%S', time.localtime())
-        if res_dir is None:
-            dir_name = path_to_result_dir + '{}_n_parameters_test_{}'.format(
-                timestamp, len(parameters)
-            )
-        else:
-            dir_name = res_dir
+    if own_maps:
+        log('Waiting for reduction of results...')
+        errors += maps.close()
+        log('Maps of test are saved ({}).'.format(os.path.join(dir_name, maps_filename)))
 
-        log_p = Log(log_path)
-        log('Starting n_parameters_test.')
-        log('Work dir: {}.'.format(dir_name))
+    log_p.close()
+    journal.close()
+    if own_store:
+        store.close()
+    if own_index and index is not None:
+        index.close()
+    harvest_stats.report(log, harvested)
+    if own_metrics:
+        metrics.report(log)
+        metrics.close()
+    if scheduler is not None and scheduler.monitor is not None:
+        scheduler.monitor.report(log)
+    if server is not None:
+        server.close()
+    if pack:
+        errors += pack_results(dir_name, log)
 
-        if len(parameters) == 1:
-            work_dir = dir_name
-            log('Work dir for subtest: {}.'.format(work_dir))
-            log('Starting parameter test...')
-            res = parameter_test(parameters[0], directory=work_dir, log=log_p.q)
-            if res == 0:
-                log('parameter_test finished successfully.')
-            else:
-                errors += res
-                log('[ERROR] parameter_test finished with errors. See {} for more information'.format(log_name))
-        else:
-            i = 1
-            for value in parameters[0].values():
-                log('Iteration {}: {}={}.'.format(str(i)*len(parameters), parameters[0].name(), value))
-                log_p.q('Iteration {}: {}={}.'.format(str(i)*len(parameters), parameters[0].name(), value))
-                set_parameter_in_file(path_to_settings, parameters[0].name(), value)
-                work_dir = dir_name + '\\{}={}'.format(
-                    parameters[0].name(), value
-                )
-                log('Running n_parameters_test...')
-                res = n_parameters_test(res_dir=work_dir, log=log_p.q, *args[1:])
-                if res == 0:
-                    log('n_parameters_test finished successfully.')
-                else:
-                    errors += res
-                    log('n_parameters_test finished with errors. See {} for more information'.format(log_name))
-                i += 1
-                log_p.sep()
-        log_p.close()
-
-        if errors != 0:
-            log('Test finished with errors. See {} for more information.'.format(log_name))
-        else:
-            log('Test finished successfully.')
-        log('Copying log file into work dir...')
+    try:
+        os.rmdir(scratch_dir)
+    except OSError:
+        pass
 
-        log_source = log_path
-        log_destination = "{}\\{}".format(dir_name, log_name)
+    if errors != 0:
+        log('Test finished with errors. See {} for more information.'.format(log_name))
+    else:
+        log('Test finished successfully.')
+    log('{} errors. Exit.'.format(errors))
+
+    finish_time = time.time()
+    log('{} finished. Seconds elapsed: {}.'.format(caller, finish_time - start_time))
+
+    return errors
+
+
+def parallel_parameters_test(*args, **kwargs):
+    kwargs['caller'] = 'parallel_parameters_test'
+    kwargs['workers'] = kwargs.get('workers') or os.cpu_count() or 1
+    return sweep_parameters_test(*args, **kwargs)
+
+
+def shard_parameters_test(*args, **kwargs):
+    # several processes, on one host or on hosts with shared res_dir, execute the same test: every shard claims
+    # runs by lock files in res_dir and writes results into its own directory; merge_shards() collects them when
+    # all shards are finished
+    start_time = time.time()
 
+    log = kwargs.get('log', print_m)
+    res_dir = kwargs.get('res_dir')
+    shard = kwargs.get('shard') or '{}_{}'.format(socket.gethostname(), os.getpid())
+    lease = kwargs.get('lease', 600.0)
+    workers = kwargs.get('workers') or 1
+    scratch_dir = kwargs.get('scratch_dir') or path_to_scratch_dir
+    cache = kwargs.get('cache')
+    scheduler = kwargs.get('scheduler')
+    wait = kwargs.get('wait', False)
+    poll = kwargs.get('poll', 10.0)
+    index = kwargs.get('index')
+    # failed run is tried again by other shards until it is failed attempts times
+    attempts = kwargs.get('attempts', 2)
+
+    parameters, errors = parameters_from_args(args, 'shard_parameters_test', log)
+    if len(parameters) == 0:
+        log('Have no parameters to test. Exit.')
+        return errors
+    if res_dir is None:
+        log('[ERROR] shard_parameters_test() needs res_dir shared by all shards.')
+        return errors + 1
+
+    document = settings_for_parameters(parameters, log)
+    if document is None:
+        return errors + 1
+
+    plan = SweepPlan(parameters, res_dir)
+    shard_dir = os.path.join(res_dir, shards_dirname, shard)
+    shard_scratch = os.path.join(scratch_dir, shard)
+    try:
+        os.makedirs(res_dir, exist_ok=True)
+        # all shards must execute the same plan
+        plan_path = os.path.join(res_dir, plan_filename)
+        if not os.path.exists(plan_path):
+            plan.write('{}.{}'.format(plan_path, shard))
+            os.replace('{}.{}'.format(plan_path, shard), plan_path)
+        with open(plan_path) as plan_file:
+            if plan_file.readlines() != plan.lines():
+                log('[ERROR] Plan of test differs from plan of other shards ({}).'.format(plan_path))
+                return errors + 1
+        for directory in plan.directories():
+            os.makedirs(os.path.join(shard_dir, os.path.relpath(directory, res_dir)), exist_ok=True)
+        os.makedirs(shard_scratch, exist_ok=True)
+    except OSError as e:
+        log('[ERROR] Cannot create directory for results ({}) - {}.'.format(repr(shard_dir), os.strerror(e.errno)))
+        return errors + 1
+
+    journal = Journal(os.path.join(shard_dir, journal_filename))
+    board = ClaimBoard(os.path.join(res_dir, claims_dirname), shard, lease)
+    # runs are indexed in directory of shard, merge_shards() moves their records with the results
+    own_index = not isinstance(index, RunIndex)
+    if own_index:
+        index = open_index(index, res_dir, log)
+    log_name = 'shard_{}.txt'.format(shard)
+    log_p = Log(os.path.join(shard_dir, log_name))
+    log('Starting shard {} of shard_parameters_test: {} runs in plan, {} workers.'.format(shard, len(plan), workers))
+    log('Work dir: {}.'.format(shard_dir))
+
+    results = {}
+    lock = threading.Lock()
+    slots = threading.BoundedSemaphore(workers)
+
+    def run(n, named_point, i, directory):
+        log_context.fields = {'run': n, 'point': dict(named_point), 'shard': shard}
         try:
-            shutil.move(log_source, log_destination)
-        except IOError as e:
-            log('[ERROR] Cannot copy log of experiment ({}) into directory for results ({}) - {}.'.format(
-                log_source, log_destination, os.strerror(e.errno)
+            point_log = lambda message: log_p.q('[{}] {}'.format(n, message))
+            point_log('Run {}: {}.'.format(n, Journal.point_key(named_point).replace(';', ', ')))
+            # journal of shard keeps directories relative to shard directory, they are merged on any host
+            relative = os.path.relpath(directory, res_dir)
+            directory = os.path.normpath(os.path.join(shard_dir, relative))
+            res = isolated_run(
+                n, named_point, i, directory, shard_scratch, document, cache, point_log, scheduler, index=index
+            )
+            if res == 0:
+                journal.record(named_point, relative.replace(os.sep, '/'), i)
+                board.done(n)
+            else:
+                # failed run is left to other shards until it is failed attempts times
+                board.fail(n)
+                board.release(n)
+            with lock:
+                results[n] = res
+            log('Run {} finished{}, {} runs finished by shard.'.format(
+                n, '' if res == 0 else ' with errors', len([r for r in results.values() if r is not None])
             ))
-            errors += 1
         except Exception as e:
-            log('[ERROR] Cannot copy log of experiment ({}) into directory for results ({}) - UnErr {}.'.format(
-                log_source, log_destination, e.message
-            ))
-            errors += 1
-        log('Done.')
-    log('{} errors. Exit.'.format(errors))
+            board.fail(n)
+            board.release(n)
+            with lock:
+                results[n] = 1
+            log('[ERROR] Run {} failed - UnErr ({}).'.format(n, e))
+        finally:
+            log_context.fields = {}
+            slots.release()
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        while True:
+            claimed = 0
+            for n, named_point, i, directory in plan:
+                if n in results or board.is_done(n) or board.failures(n) >= attempts:
+                    continue
+                slots.acquire()
+                if not board.claim(n):
+                    slots.release()
+                    continue
+                claimed += 1
+                with lock:
+                    results.setdefault(n, None)
+                executor.submit(run, n, named_point, i, directory)
+
+            if claimed == 0 and not wait:
+                break
+            if claimed == 0:
+                # runs which are free or held by possibly dead shards are waited for and taken over after their
+                # lease; runs which are failed, were executed by this shard or are executed by live shards are not
+                with lock:
+                    executed = set(results)
+                waiting = [
+                    run for run in plan
+                    if run[0] not in executed and not board.is_done(run[0])
+                    and board.failures(run[0]) < attempts and not board.is_live(run[0])
+                ]
+                if not waiting and len([r for r in results.values() if r is None]) == 0:
+                    break
+                time.sleep(poll)
+
+    errors += len([res for res in results.values() if res != 0])
+    remaining = len([run for run in plan if not board.is_done(run[0])])
+    failed = [run[0] for run in plan if not board.is_done(run[0]) and board.failures(run[0]) >= attempts]
+    if failed:
+        log('[ERROR] Runs {} of test are failed {} times, they are not tried again.'.format(
+            ', '.join(str(n) for n in failed), attempts
+        ))
+    board.close()
+    journal.close()
+    log_p.close()
+    if own_index and index is not None:
+        index.close()
+
+    try:
+        os.rmdir(shard_scratch)
+        os.rmdir(scratch_dir)
+    except OSError:
+        pass
+
+    log('Shard {} finished: {} runs, {} errors, {} runs of test are not finished.'.format(
+        shard, len(results), errors, remaining
+    ))
 
     finish_time = time.time()
-    log('n_parameters_test finished. Seconds elapsed: {}.'.format(finish_time - start_time))
+    log('shard_parameters_test finished. Seconds elapsed: {}.'.format(finish_time - start_time))
+    return errors
+
+
+def merge_shards(res_dir, log=print_m, index=None):
+    # results of all shards are moved into the layout of n_parameters_test in res_dir; if a run was executed by
+    # several shards (after lease of a slow shard expired), the first results are kept; lock files are kept as
+    # the record of runs finished, so shards started later do not repeat them
+    errors = 0
+    shards_dir = os.path.join(res_dir, shards_dirname)
+    merge_lock = os.path.join(res_dir, claims_dirname, 'merge.lock')
+    try:
+        os.makedirs(os.path.dirname(merge_lock), exist_ok=True)
+        os.close(os.open(merge_lock, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o644))
+    except FileExistsError:
+        log('[ERROR] Shards are merged by other process already ({}).'.format(merge_lock))
+        return 1
 
+    journal = Journal(os.path.join(res_dir, journal_filename), resume=True)
+    own_index = not isinstance(index, RunIndex)
+    if own_index:
+        index = open_index(index, res_dir, log)
+    log('Merging shards of test in {}.'.format(res_dir))
+    shards = sorted(os.listdir(shards_dir)) if os.path.isdir(shards_dir) else []
+    for shard in shards:
+        shard_dir = os.path.join(shards_dir, shard)
+        shard_journal = Journal(os.path.join(shard_dir, journal_filename), resume=True)
+        shard_journal.close()
+        shard_errors = 0
+
+        for key, (directory, i) in sorted(shard_journal.finished.items()):
+            if key in journal.finished:
+                log('Point {} is merged already, results of shard {} are skipped.'.format(key, shard))
+                continue
+            if os.path.isabs(directory):
+                destination = os.path.join(res_dir, os.path.relpath(directory, shard_dir))
+            else:
+                # directory is relative to shard directory, shards could be written on hosts with other paths
+                destination = os.path.join(res_dir, *directory.split('/'))
+                directory = os.path.join(shard_dir, *directory.split('/'))
+            prefix = '{}_'.format(i)
+            try:
+                os.makedirs(destination, exist_ok=True)
+                for filename in os.listdir(directory):
+                    if filename.startswith(prefix):
+                        os.replace(os.path.join(directory, filename), os.path.join(destination, filename))
+            except OSError as e:
+                log('[ERROR] Cannot merge results of point {} ({}) into {} - {}.'.format(
+                    key, directory, destination, os.strerror(e.errno)
+                ))
+                shard_errors += 1
+                continue
+            journal.record(key, destination, i)
+            if index is not None:
+                # records of runs indexed on other hosts (other paths of res_dir) are added again
+                try:
+                    if index.move(os.path.normpath(directory), i, os.path.normpath(destination)) is None:
+                        named_point = tuple(tuple(item.split('=', 1)) for item in key.split(';') if '=' in item)
+                        index_run(index, named_point, os.path.normpath(destination), i, {}, log)
+                except Exception as e:
+                    log('[ERROR] Cannot add run into index of runs ({}) - UnErr ({}).'.format(index.filename, e))
+
+        # logs of shards are kept in directory for results
+        for filename in os.listdir(shard_dir):
+            if filename.startswith('shard_'):
+                os.replace(os.path.join(shard_dir, filename), os.path.join(res_dir, filename))
+        if shard_errors == 0:
+            shutil.rmtree(shard_dir, ignore_errors=True)
+        errors += shard_errors
+        log('Shard {} is merged{}.'.format(shard, '' if shard_errors == 0 else ' with {} errors'.format(shard_errors)))
+
+    merged = len(journal.finished)
+    journal.close()
+    if own_index and index is not None:
+        index.close()
+    try:
+        os.rmdir(shards_dir)
+    except OSError:
+        pass
+
+    try:
+        with open(os.path.join(res_dir, plan_filename)) as plan_file:
+            planned = len(plan_file.readlines())
+    except OSError:
+        planned = None
+    os.remove(merge_lock)
+    log('{} points are merged{}. {} errors.'.format(
+        merged, '' if planned is None else ' of {}'.format(planned), errors
+    ))
     return errors
 
 
-def coordinates_test_1d(x, res_dir=None, log=print_m):
+def adaptive_parameters_test(metric, *args, **kwargs):
+    # metric(directory, i) gives a number from results of run saved as directory\{i}_*; test starts from the grid
+    # of parameters and splits the cells where metric changes more than tolerance, until budget of runs is spent
     start_time = time.time()
-    errors = 0
-    log_name = '{}_{}-{}.txt'.format(x.name(), x.begin(), x.end())
-    log_path = path_to_solution + log_name
+
+    log = kwargs.get('log', print_m)
+    res_dir = kwargs.get('res_dir')
+    tolerance = kwargs.get('tolerance', 0)
+    budget = kwargs.get('budget')
+    # coarse is number of values of every parameter in the first grid, max_depth limits splits of one cell in
+    # addition to the step of parameters
+    coarse = kwargs.get('coarse', 3)
+    max_depth = kwargs.get('max_depth')
+    workers = kwargs.get('workers') or os.cpu_count() or 1
+    scratch_dir = kwargs.get('scratch_dir') or path_to_scratch_dir
+    cache = kwargs.get('cache')
+    scheduler = kwargs.get('scheduler')
+    run_metrics = kwargs.get('metrics')
+    index = kwargs.get('index')
+
+    parameters, errors = parameters_from_args(args, 'adaptive_parameters_test', log)
+    if len(parameters) == 0:
+        log('Have no parameters to test. Exit.')
+        return errors
+
+    document = settings_for_parameters(parameters, log)
+    if document is None:
+        return errors + 1
 
     timestamp = time.strftime('%Y%m%d%H%M%S', time.localtime())
     if res_dir is None:
-        dir_name = path_to_result_dir + '{}_coordinates_test_1d_{}'.format(timestamp, x.name())
+        dir_name = path_to_result_dir + '{}_adaptive_parameters_test_{}'.format(timestamp, len(parameters))
     else:
         dir_name = res_dir
 
-    log_p = Log(log_path)
-    log('Starting coordinates_test_1d.')
+    try:
+        os.makedirs(dir_name, exist_ok=True)
+        os.makedirs(scratch_dir, exist_ok=True)
+    except OSError as e:
+        log('[ERROR] Cannot create directory for results ({}) - {}.'.format(repr(dir_name), os.strerror(e.errno)))
+        return errors + 1
+
+    axes = [Axis.from_parameter(parameter) for parameter in parameters]
+    names = [a.name() for a in axes]
+    log_name = 'a{}_{}_{}-{}.txt'.format(
+        len(parameters), parameters[0].name(), parameters[0].begin(), parameters[0].end()
+    )
+    own_metrics = run_metrics is True
+    if own_metrics:
+        run_metrics = sweep_metrics(dir_name, log)
+    own_index = not isinstance(index, RunIndex)
+    if own_index:
+        index = open_index(index, dir_name, log)
+
+    log_p = Log(os.path.join(dir_name, log_name))
+    table = open(os.path.join(dir_name, adaptive_filename), 'w')
+    lock = threading.Lock()
+    metrics = {}
+    evaluated = set()
+    numbers = itertools.count(1)
+
+    log('Starting adaptive_parameters_test: tolerance {}, budget {}.'.format(tolerance, budget))
     log('Work dir: {}.'.format(dir_name))
-    log('x = {}'.format(x))
-    log('Running parameter test...')
-    res = parameter_test(x, dir_name, log_p.q)
+
+    def finished(n, named_point, directory, i, run_log):
+        try:
+            value = metric(directory, i)
+        except Exception as e:
+            run_log('[ERROR] Cannot compute metric - UnErr ({}).'.format(e))
+            return
+        with lock:
+            metrics[tuple(v for _, v in named_point)] = value
+            table.write('{}\t{}\t{}\n'.format(n, Journal.point_key(named_point), value))
+            table.flush()
+
+    def to_point(indices):
+        return tuple(a.value(k) for a, k in zip(axes, indices))
+
+    def evaluate(points):
+        # every run gets the next number, it is used as index of files in directory of point
+        runs = []
+        for indices in points:
+            named_point = tuple(zip(names, to_point(indices)))
+            n = next(numbers)
+            runs.append((n, named_point, n, point_directory(dir_name, named_point)))
+            os.makedirs(runs[-1][3], exist_ok=True)
+            evaluated.add(indices)
+        results = run_points(
+            runs, scratch_dir, document, cache, workers, log, log_p.q, finished, scheduler, run_metrics, index
+        )
+        return sum(results.values())
+
+    def variation(cell):
+        values = [metrics.get(to_point(corner)) for corner in itertools.product(*cell)]
+        if None in values:
+            return None
+        return max(values) - min(values)
+
+    # coarse grid is always evaluated, budget limits the refinement only; cells are kept as indices of values of
+    # parameters, so only values of their grids are written into settings
+    coarse_indices = []
+    for a in axes:
+        m = max(min(coarse, len(a)), 1)
+        coarse_indices.append(sorted(set(int(round(k * (len(a) - 1) / max(m - 1, 1))) for k in range(m))))
+    errors += evaluate(list(itertools.product(*coarse_indices)))
+
+    heap = []
+    counter = itertools.count()
+    for cell in itertools.product(*[list(zip(c[:-1], c[1:])) or [(c[0], c[0])] for c in coarse_indices]):
+        v = variation(cell)
+        if v is not None:
+            heapq.heappush(heap, (-v, next(counter), cell, 0))
+
+    while heap:
+        v, _, cell, depth = heapq.heappop(heap)
+        if -v <= tolerance:
+            log('All cells are resolved within tolerance.')
+            break
+        if all(hi - lo <= 1 for lo, hi in cell) or max_depth is not None and depth >= max_depth:
+            # cell spans adjacent values of parameters, it cannot be split
+            continue
+
+        # corners of all subcells which are not evaluated yet
+        splits = [sorted(set((lo, (lo + hi) // 2, hi))) for lo, hi in cell]
+        points = [p for p in itertools.product(*splits) if p not in evaluated]
+        if budget is not None and len(evaluated) + len(points) > budget:
+            log('Budget of runs is spent ({} runs).'.format(len(evaluated)))
+            break
+
+        log('Refining cell {} (variation {}, depth {}): {} runs.'.format(
+            tuple((a.value(lo), a.value(hi)) for a, (lo, hi) in zip(axes, cell)), -v, depth, len(points)
+        ))
+        errors += evaluate(points)
+
+        for subcell in set(itertools.product(*[list(zip(s[:-1], s[1:])) or [(s[0], s[0])] for s in splits])):
+            sv = variation(subcell)
+            if sv is not None:
+                heapq.heappush(heap, (-sv, next(counter), subcell, depth + 1))
+
+    table.close()
     log_p.close()
+    if own_metrics:
+        run_metrics.report(log)
+        run_metrics.close()
+    if own_index and index is not None:
+        index.close()
 
-    if res != 0:
+    try:
+        os.rmdir(scratch_dir)
+    except OSError:
+        pass
+
+    log('{} runs, {} points with metric. See {}.'.format(len(evaluated), len(metrics), adaptive_filename))
+    if errors != 0:
         log('Test finished with errors. See {} for more information.'.format(log_name))
-        errors += res
     else:
         log('Test finished successfully.')
-    log('Copying log file into work dir...')
-
-    log_source = log_path
-    log_destination = "{}\\{}".format(dir_name, log_name)
-    try:
-        shutil.move(log_source, log_destination)
-    except IOError as e:
-        log('[ERROR] Cannot copy log of experiment ({}) into directory for results ({}) - {}.'.format(
-            log_source, log_destination, os.strerror(e.errno)
-        ))
-        errors += 1
-    except Exception as e:
-        log('[ERROR] Cannot copy log of experiment ({}) into directory for results ({}) - UnErr {}.'.format(
-            log_source, log_destination, e.message
-        ))
-        errors += 1
-    log('Done.')
     log('{} errors. Exit.'.format(errors))
 
     finish_time = time.time()
-    log('coordinate_test_1d finished. Seconds elapsed: {}.'.format(finish_time - start_time))
+    log('adaptive_parameters_test finished. Seconds elapsed: {}.'.format(finish_time - start_time))
 
     return errors
 
 
-def coordinates_test_2d(x, y, res_dir=None, log=print_m):
+def screening_parameters_test(score, *args, **kwargs):
+    # every point is executed with low fidelity settings (low={setting: value}), then points are ranked by
+    # score(directory, i) of their results and the best fraction of them is executed again with settings of solution;
+    # results of both levels are kept in low and full directories of work dir
     start_time = time.time()
-    errors = 0
-    log_name = '{}_{}-{}_{}_{}-{}.txt'.format(x.name(), x.begin(), x.end(), y.name(), y.begin(), y.end())
-    log_path = path_to_solution + log_name
+
+    log = kwargs.get('log', print_m)
+    res_dir = kwargs.get('res_dir')
+    low = kwargs.get('low') or {}
+    fraction = kwargs.get('fraction', 0.1)
+    top = kwargs.get('top')
+    maximize = kwargs.get('maximize', True)
+    workers = kwargs.get('workers') or os.cpu_count() or 1
+    scratch_dir = kwargs.get('scratch_dir') or path_to_scratch_dir
+    cache = kwargs.get('cache')
+    scheduler = kwargs.get('scheduler')
+    metrics = kwargs.get('metrics')
+    index = kwargs.get('index')
+
+    parameters, errors = parameters_from_args(args, 'screening_parameters_test', log)
+    if len(parameters) == 0:
+        log('Have no parameters to test. Exit.')
+        return errors
+    if not low:
+        log('[ERROR] screening_parameters_test() is given no low fidelity settings. Exit.')
+        return errors + 1
+
+    document = settings_for_parameters(parameters, log)
+    if document is None:
+        return errors + 1
+    low_document = document.copy()
+    try:
+        low_document.update(low)
+    except KeyError as e:
+        log('[ERROR] Cannot use low fidelity settings - {}.'.format(e))
+        return errors + 1
 
     timestamp = time.strftime('%Y%m%d%H%M%S', time.localtime())
     if res_dir is None:
-        dir_name = path_to_result_dir + '{}_coordinates_test_2d_{}_{}'.format(timestamp, x.name(), y.name())
+        dir_name = path_to_result_dir + '{}_screening_parameters_test_{}'.format(timestamp, len(parameters))
     else:
         dir_name = res_dir
 
-    log_p = Log(log_path)
-    log('Starting coordinates_test_2d.')
+    low_plan = SweepPlan(parameters, os.path.join(dir_name, 'low'))
+    try:
+        for directory in low_plan.directories():
+            os.makedirs(directory, exist_ok=True)
+        os.makedirs(scratch_dir, exist_ok=True)
+    except OSError as e:
+        log('[ERROR] Cannot create directory for results ({}) - {}.'.format(repr(dir_name), os.strerror(e.errno)))
+        return errors + 1
+
+    log_name = 's{}_{}_{}-{}.txt'.format(
+        len(parameters), parameters[0].name(), parameters[0].begin(), parameters[0].end()
+    )
+    own_metrics = metrics is True
+    if own_metrics:
+        metrics = sweep_metrics(dir_name, log)
+    own_index = not isinstance(index, RunIndex)
+    if own_index:
+        index = open_index(index, dir_name, log)
+
+    log_p = Log(os.path.join(dir_name, log_name))
+    table = open(os.path.join(dir_name, screening_filename), 'w')
+    table.write('run\tpoint\tfidelity\tscore\tresults\n')
+    lock = threading.Lock()
+    scores = {}
+
+    log('Starting screening_parameters_test: {} points, low fidelity settings {}.'.format(
+        len(low_plan), Journal.point_key(sorted(low.items()))
+    ))
     log('Work dir: {}.'.format(dir_name))
-    log('x = {}'.format(x))
-    log('y = {}'.format(y))
-    log('Running parameter test...')
-    i = 1
-    for value in x.values():
-        log('Iteration {}: {}={}.'.format(str(i)*2, x.name(), value))
-        log_p.q('Iteration {}: {}={}.'.format(str(i)*2, x.name(), value))
-        set_parameter_in_file(path_to_settings, x.name(), value)
-        timestamp = time.strftime('%Y%m%d%H%M%S', time.localtime())
-        exp_dir_name = dir_name + '\\{}_coordinates_test_1d_{}_{}={}'.format(timestamp, y.name(), x.name(), value)
-        log('Running coordinates_test_1d...')
-        res = coordinates_test_1d(y, exp_dir_name, log_p.q)
-        if res == 0:
-            log('{}={}, coordinates_test_1d({}) finished successfully.'.format(
-                x.name(), value, y
-            ))
-        else:
-            errors += res
-            log('[ERROR] {}={}, coordinates_test_1d({}) finished with errors. See {} for more information'.format(
-                x.name(), value, y, log_name
-            ))
-        i += 1
+
+    def scored(fidelity):
+        def finished(n, named_point, directory, i, run_log):
+            try:
+                value = score(directory, i)
+            except Exception as e:
+                run_log('[ERROR] Cannot compute score - UnErr ({}).'.format(e))
+                value = None
+            with lock:
+                if fidelity == 'low' and value is not None:
+                    scores[named_point] = value
+                table.write('{}\t{}\t{}\t{}\t{}\n'.format(
+                    n, Journal.point_key(named_point), fidelity, '' if value is None else value,
+                    os.path.join(directory, '{}_*'.format(i))
+                ))
+                table.flush()
+        return finished
+
+    log('Screening of all points with low fidelity...')
+    results = run_points(
+        list(low_plan), scratch_dir, low_document, cache, workers, log, log_p.q, scored('low'), scheduler, metrics,
+        index
+    )
+    errors += sum(results.values())
+
+    # points without score (failed runs) are never selected
+    ranked = sorted(scores, key=lambda point: scores[point], reverse=maximize)
+    selected = ranked[:top if top is not None else max(int(math.ceil(fraction * len(ranked))), 1)]
+    log('{} of {} points are scored, {} best of them are executed with full fidelity.'.format(
+        len(ranked), len(low_plan), len(selected)
+    ))
+    if selected:
+        log('Scores of selected points: {} .. {}.'.format(scores[selected[0]], scores[selected[-1]]))
+
+        # full runs keep numbers of their points in low plan, so results of both levels are easy to compare
+        full_plan = SweepPlan(parameters, os.path.join(dir_name, 'full'))
+        chosen = set(selected)
+        full_runs = [run for run in full_plan if run[1] in chosen]
+        try:
+            for directory in set(run[3] for run in full_runs):
+                os.makedirs(directory, exist_ok=True)
+        except OSError as e:
+            log('[ERROR] Cannot create directory for results ({}) - {}.'.format(repr(dir_name), os.strerror(e.errno)))
+            errors += 1
+            full_runs = []
+        results = run_points(
+            full_runs, scratch_dir, document, cache, workers, log, log_p.q, scored('full'), scheduler, metrics, index
+        )
+        errors += sum(results.values())
+
+    table.close()
     log_p.close()
+    if own_index and index is not None:
+        index.close()
+    if own_metrics:
+        metrics.report(log)
+        metrics.close()
+
+    try:
+        os.rmdir(scratch_dir)
+    except OSError:
+        pass
 
+    log('Scores and fidelity of all runs: {}.'.format(screening_filename))
     if errors != 0:
         log('Test finished with errors. See {} for more information.'.format(log_name))
     else:
         log('Test finished successfully.')
-    log('Copying log file into work dir...')
-
-    log_source = log_path
-    log_destination = "{}\\{}".format(dir_name, log_name)
-    try:
-        shutil.move(log_source, log_destination)
-    except IOError as e:
-        log('[ERROR] Cannot copy log of experiment ({}) into directory for results ({}) - {}.'.format(
-            log_source, log_destination, os.strerror(e.errno)
-        ))
-        errors += 1
-    except Exception as e:
-        log('[ERROR] Cannot copy log of experiment ({}) into directory for results ({}) - UnErr {}.'.format(
-            log_source, log_destination, e.message
-        ))
-        errors += 1
-    log('Done.')
     log('{} errors. Exit.'.format(errors))
 
     finish_time = time.time()
-    log('coordinate_test_2d finished. Seconds elapsed: {}.'.format(finish_time - start_time))
+    log('screening_parameters_test finished. Seconds elapsed: {}.'.format(finish_time - start_time))
 
     return errors
 
 
-def coordinates_test_3d(x, y, z, res_dir=None, log=print_m):
+def optimize_parameters(objective, *args, **kwargs):
+    # objective(directory, i) gives a number from results of run saved as directory\{i}_*; it is minimized
+    # (or maximized) by Nelder-Mead search inside the bounds of parameters, points are snapped to the values of
+    # parameters, so a point is never executed twice; returns best (named point, value) and all evaluations
     start_time = time.time()
-    errors = 0
-    log_name = '{}_{}-{}_{}_{}-{}_{}_{}-{}.txt'.format(
-        x.name(), x.begin(), x.end(),
-        y.name(), y.begin(), y.end(),
-        z.name(), z.begin(), z.end()
-    )
-    log_path = path_to_solution + log_name
+
+    log = kwargs.get('log', print_m)
+    res_dir = kwargs.get('res_dir')
+    budget = kwargs.get('budget', 20)
+    maximize = kwargs.get('maximize', False)
+    xtol = kwargs.get('xtol', 1e-3)
+    workers = kwargs.get('workers') or os.cpu_count() or 1
+    scratch_dir = kwargs.get('scratch_dir') or path_to_scratch_dir
+    cache = kwargs.get('cache')
+    scheduler = kwargs.get('scheduler')
+    metrics = kwargs.get('metrics')
+    index = kwargs.get('index')
+
+    parameters, errors = parameters_from_args(args, 'optimize_parameters', log)
+    if len(parameters) == 0:
+        log('Have no parameters to optimize. Exit.')
+        return None, []
+
+    document = settings_for_parameters(parameters, log)
+    if document is None:
+        return None, []
 
     timestamp = time.strftime('%Y%m%d%H%M%S', time.localtime())
     if res_dir is None:
-        dir_name = path_to_result_dir + '{}_coordinates_test_3d_{}_{}_{}'.format(
-            timestamp, x.name(), y.name(), z.name()
-        )
+        dir_name = path_to_result_dir + '{}_optimize_parameters_{}'.format(timestamp, len(parameters))
     else:
         dir_name = res_dir
 
-    log_p = Log(log_path)
-    log('Starting coordinates_test_3d.')
+    try:
+        os.makedirs(dir_name, exist_ok=True)
+        os.makedirs(scratch_dir, exist_ok=True)
+    except OSError as e:
+        log('[ERROR] Cannot create directory for results ({}) - {}.'.format(repr(dir_name), os.strerror(e.errno)))
+        return None, []
+
+    axes = [Axis.from_parameter(parameter) for parameter in parameters]
+    names = [a.name() for a in axes]
+    log_name = 'o{}_{}_{}-{}.txt'.format(
+        len(parameters), parameters[0].name(), parameters[0].begin(), parameters[0].end()
+    )
+    own_metrics = metrics is True
+    if own_metrics:
+        metrics = sweep_metrics(dir_name, log)
+    own_index = not isinstance(index, RunIndex)
+    if own_index:
+        index = open_index(index, dir_name, log)
+
+    log_p = Log(os.path.join(dir_name, log_name))
+    table = open(os.path.join(dir_name, optimize_filename), 'w')
+    lock = threading.Lock()
+    values = {}
+    evaluations = []
+    numbers = itertools.count(1)
+
+    log('Starting optimize_parameters: budget {}, {}.'.format(budget, 'maximum' if maximize else 'minimum'))
     log('Work dir: {}.'.format(dir_name))
-    log('x = {}'.format(x))
-    log('y = {}'.format(y))
-    log('z = {}'.format(z))
-    log('Running parameter test...')
-    i = 1
-    for value in x.values():
-        log('Iteration {}: {}={}.'.format(str(i)*3, x.name(), value))
-        log_p.q('Iteration {}: {}={}.'.format(str(i)*3, x.name(), value))
-        set_parameter_in_file(path_to_settings, x.name(), value)
-        timestamp = time.strftime('%Y%m%d%H%M%S', time.localtime())
-        exp_dir_name = dir_name + '\\{}_coordinates_test_2d_{}_{}_{}={}'.format(
-            timestamp, y.name(), z.name(), x.name(), value
+
+    def to_point(x):
+        # coordinates in [0, 1] are mapped to the nearest values of parameters
+        return tuple(
+            a.value(int(round(min(max(c, 0.0), 1.0) * (len(a) - 1)))) for c, a in zip(x, axes)
         )
-        log('Running coordinates_test_2d...')
-        res = coordinates_test_2d(y, z, exp_dir_name, log_p.q)
-        if res == 0:
-            log('{}={}, coordinates_test_2d({}, {}) finished successfully.'.format(
-                x.name(), value, y, z
-            ))
+
+    def finished(n, named_point, directory, i, run_log):
+        try:
+            value = objective(directory, i)
+        except Exception as e:
+            run_log('[ERROR] Cannot compute objective - UnErr ({}).'.format(e))
+            return
+        with lock:
+            values[tuple(v for _, v in named_point)] = value
+            evaluations.append((n, named_point, value))
+            table.write('{}\t{}\t{}\n'.format(n, Journal.point_key(named_point), value))
+            table.flush()
+
+    def score(point):
+        value = values.get(point)
+        if value is None:
+            return float('inf')
+        return -value if maximize else value
+
+    def evaluate(xs):
+        # new points are executed together, failed runs are kept with value None, so they are not repeated
+        nonlocal errors
+        points = []
+        for point in [to_point(x) for x in xs]:
+            if point not in values and point not in points and len(values) + len(points) < budget:
+                points.append(point)
+
+        runs = []
+        for point in points:
+            n = next(numbers)
+            named_point = tuple(zip(names, point))
+            runs.append((n, named_point, n, point_directory(dir_name, named_point)))
+            os.makedirs(runs[-1][3], exist_ok=True)
+        results = run_points(
+            runs, scratch_dir, document, cache, workers, log, log_p.q, finished, scheduler, metrics, index
+        )
+        errors += sum(results.values())
+
+        for point in points:
+            values.setdefault(point, None)
+        return [score(to_point(x)) for x in xs], len(points)
+
+    d = len(axes)
+    simplex = [[0.5] * d] + [[0.5 + (0.25 if j == k else 0.0) for j in range(d)] for k in range(d)]
+    f, _ = evaluate(simplex)
+    stalls = 0
+
+    while len(values) < budget and stalls <= 2 * (d + 1):
+        order = sorted(range(d + 1), key=lambda k: f[k])
+        simplex = [simplex[k] for k in order]
+        f = [f[k] for k in order]
+
+        size = max(max(abs(a - b) for a, b in zip(x, simplex[0])) for x in simplex[1:])
+        if size < xtol or len(set(to_point(x) for x in simplex)) == 1:
+            log('Simplex is collapsed, search is finished.')
+            break
+
+        centroid = [sum(x[j] for x in simplex[:-1]) / d for j in range(d)]
+        step = lambda t, x: [min(max(c + t * (c - w), 0.0), 1.0) for c, w in zip(centroid, x)]
+
+        # reflection, expansion, contraction and shrink of Nelder-Mead method
+        xr = step(1.0, simplex[-1])
+        (fr,), new = evaluate([xr])
+        if f[0] <= fr < f[-2]:
+            simplex[-1], f[-1] = xr, fr
+        elif fr < f[0]:
+            xe = step(2.0, simplex[-1])
+            (fe,), n = evaluate([xe])
+            new += n
+            simplex[-1], f[-1] = (xe, fe) if fe < fr else (xr, fr)
         else:
-            errors += res
-            log('[ERROR] {}={}, coordinates_test_2d({}, {}) finished with errors. See {} for more information'.format(
-                x.name(), value, y, z, log_name
-            ))
-        i += 1
-    log_p.close()
+            xc = step(-0.5, simplex[-1]) if fr >= f[-1] else step(0.5, simplex[-1])
+            (fc,), n = evaluate([xc])
+            new += n
+            if fc < min(fr, f[-1]):
+                simplex[-1], f[-1] = xc, fc
+            else:
+                simplex = [simplex[0]] + [[b + 0.5 * (c - b) for b, c in zip(simplex[0], x)] for x in simplex[1:]]
+                fs, n = evaluate(simplex[1:])
+                f = [f[0]] + fs
+                new += n
 
-    if errors != 0:
-        log('Test finished with errors. See {} for more information.'.format(log_name))
-    else:
-        log('Test finished successfully.')
-    log('Copying log file into work dir...')
+        # iterations over executed points do not spend budget, but search must not cycle on them
+        stalls = stalls + 1 if new == 0 else 0
+
+    table.close()
+    log_p.close()
+    if own_metrics:
+        metrics.report(log)
+        metrics.close()
+    if own_index and index is not None:
+        index.close()
 
-    log_source = log_path
-    log_destination = "{}\\{}".format(dir_name, log_name)
     try:
-        shutil.move(log_source, log_destination)
-    except IOError as e:
-        log('[ERROR] Cannot copy log of experiment ({}) into directory for results ({}) - {}.'.format(
-            log_source, log_destination, os.strerror(e.errno)
-        ))
-        errors += 1
-    except Exception as e:
-        log('[ERROR] Cannot copy log of experiment ({}) into directory for results ({}) - UnErr {}.'.format(
-            log_source, log_destination, e.message
-        ))
-        errors += 1
-    log('Done.')
-    log('{} errors. Exit.'.format(errors))
+        os.rmdir(scratch_dir)
+    except OSError:
+        pass
+
+    best = None
+    for point in values:
+        if values[point] is not None and (best is None or score(point) < score(best)):
+            best = point
+    if best is None:
+        log('[ERROR] Objective is not computed for any point.')
+        return None, evaluations
+
+    best = (tuple(zip(names, best)), values[best])
+    log('{} runs, {} errors. Best point: {} = {}.'.format(
+        len(values), errors, Journal.point_key(best[0]), best[1]
+    ))
 
     finish_time = time.time()
-    log('coordinate_test_3d finished. Seconds elapsed: {}.'.format(finish_time - start_time))
+    log('optimize_parameters finished. Seconds elapsed: {}.'.format(finish_time - start_time))
 
-    return errors
+    return best, sorted(evaluations)
+
+
+def coordinates_test(caller, parameters, res_dir=None, log=print_m, cache=None, scheduler=None, metrics=None):
+    # coordinates tests are sweeps with the work dir named after their parameters
+    if res_dir is None:
+        timestamp = time.strftime('%Y%m%d%H%M%S', time.localtime())
+        res_dir = path_to_result_dir + '{}_{}_{}'.format(
+            timestamp, caller, '_'.join(parameter.name() for parameter in parameters)
+        )
+    return sweep_parameters_test(
+        res_dir=res_dir, log=log, caller=caller, workers=0, cache=cache, scheduler=scheduler, metrics=metrics,
+        *parameters
+    )
+
+
+def coordinates_test_1d(x, res_dir=None, log=print_m, cache=None, scheduler=None, metrics=None):
+    return coordinates_test('coordinates_test_1d', (x,), res_dir, log, cache, scheduler, metrics)
+
+
+def coordinates_test_2d(x, y, res_dir=None, log=print_m, cache=None, scheduler=None, metrics=None):
+    return coordinates_test('coordinates_test_2d', (x, y), res_dir, log, cache, scheduler, metrics)
+
+
+def coordinates_test_3d(x, y, z, res_dir=None, log=print_m, cache=None, scheduler=None, metrics=None):
+    return coordinates_test('coordinates_test_3d', (x, y, z), res_dir, log, cache, scheduler, metrics)
 
 
 # end